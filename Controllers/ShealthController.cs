@@ -4,6 +4,7 @@ using Microsoft.AspNetCore.Authorization;
 using Microsoft.AspNetCore.Identity;
 using Microsoft.AspNetCore.Mvc;
 using Microsoft.EntityFrameworkCore;
+using System.Data;
 using System.Globalization;
 using System.IO.Compression;
 using System.Text.RegularExpressions;
@@ -181,6 +182,18 @@ END;";
             return Ok(new { zipFiles = zips, extracted = folders });
         }
 
+        // Weekly/monthly/yearly sums + 7/30-day rolling means written by the last process-all
+        // (tools/shealth_rollup.py); already compact and sorted, so it is streamed as-is.
+        // GET /api/shealth/rollups
+        [HttpGet("rollups")]
+        public IActionResult Rollups()
+        {
+            var path = Path.Combine(_cfg.RawDir, "steps_summary_pedometer.rollup.json");
+            if (!System.IO.File.Exists(path))
+                return NotFound("No rollups yet. Run process-all first.");
+            return PhysicalFile(path, "application/json");
+        }
+
         // ==================== NEW: Process ALL extracted folders ====================
         // Runs the Python once (scans all RAW_DATA), creates trigger, and imports the CSV.
         // POST /api/shealth/process-all?userId=<optional>
@@ -219,6 +232,20 @@ END;";
             // Python side uses these envs
             psi.Environment["SHEALTH_RAW_DATA"] = _cfg.RawDir;        // ...\Samsung-Data\RAW_DATA
             psi.Environment["SHEALTH_OUTPUT_DIR"] = _cfg.RawDir;        // write CSV here
+            psi.Environment["SHEALTH_ZIP_DIR"] = _cfg.ZipDir;           // used when SHEALTH_SOURCE=zip
+            var metricsPath = Path.Combine(_cfg.RawDir, "process-all.metrics.json");
+            psi.Environment["SHEALTH_METRICS"] = metricsPath;           // per-stage timings/counters
+            psi.Environment["SHEALTH_DELTA"] = "1";                     // also write only the days changed since our last import
+            psi.Environment["SHEALTH_DELTA_KEY"] = uid;                 // snapshot per target user
+            psi.Environment["SHEALTH_ROLLUP"] = "1";                    // steps_summary_pedometer.rollup.json for GET rollups
+            psi.Environment["SHEALTH_SQL"] = "sql";                     // batched multi-row upserts for those days
+            psi.Environment["SHEALTH_SQL_USER"] = uid;
+            // Per-user names (upsert.<key>.sql, delta.<key>.csv): a concurrent run for another
+            // user can't overwrite or hand us its files
+            var sqlPath = Path.Combine(_cfg.RawDir, $"steps_summary_pedometer.upsert.{SnapshotKey(uid)}.sql");
+            if (System.IO.File.Exists(sqlPath)) System.IO.File.Delete(sqlPath); // never replay a stale batch
+            var deltaCsvPath = Path.Combine(_cfg.RawDir, $"steps_summary_pedometer.delta.{SnapshotKey(uid)}.csv");
+            if (System.IO.File.Exists(deltaCsvPath)) System.IO.File.Delete(deltaCsvPath); // nor a stale delta
             var proc = System.Diagnostics.Process.Start(psi)!;
             var stdoutTask = proc.StandardOutput.ReadToEndAsync();
             var stderrTask = proc.StandardError.ReadToEndAsync();
@@ -246,60 +273,106 @@ END;";
                 return Problem($"Python failed (exit {exit}). See log: {logPath}\n{shortErr}");
             }
 
-            // Read CSV produced by the Python
-            var csvPath = Path.Combine(_cfg.RawDir, "steps_summary_pedometer.csv");
+            // Read CSV produced by the Python: prefer the delta (changed days only),
+            // fall back to the full timeline
+            var fullCsvPath = Path.Combine(_cfg.RawDir, "steps_summary_pedometer.csv");
+            var isDelta = System.IO.File.Exists(deltaCsvPath);
+            var csvPath = isDelta ? deltaCsvPath : fullCsvPath;
             if (!System.IO.File.Exists(csvPath))
                 return Problem($"Expected output not found: {csvPath}");
 
             var lines = await System.IO.File.ReadAllLinesAsync(csvPath, ct);
             int upserted = 0;
+            int affectedRows = 0; // raw affected-rows total (MySQL: 1 per insert, 2 per changed row)
             int rows = 0;
+            int statements = 0;
 
-            // Import ALL rows (no skipping) — trigger will handle low step days
-            for (int i = 1; i < lines.Length; i++)
+            if (System.IO.File.Exists(sqlPath))
             {
-                ct.ThrowIfCancellationRequested();
-                var line = lines[i].Trim();
-                if (string.IsNullOrWhiteSpace(line)) continue;
-                var parts = line.Split(',');
-                if (parts.Length < 3) continue;
-
-                if (!DateTime.TryParseExact(parts[0].Trim(), "yyyy-MM-dd", CultureInfo.InvariantCulture,
-                                            DateTimeStyles.None, out var dayDt))
-                    continue;
-
-                var day = DateOnly.FromDateTime(dayDt);
-
-                int steps = 0;
-                _ = int.TryParse(parts[1].Trim(), NumberStyles.Integer, CultureInfo.InvariantCulture, out steps);
-
-                decimal distKm = 0m;
-                _ = decimal.TryParse(parts[2].Trim(), NumberStyles.Float, CultureInfo.InvariantCulture, out distKm);
-
-                // Insert or upsert (keep max values)
-                var affected = await _db.Database.ExecuteSqlInterpolatedAsync($@"
-                    INSERT INTO FitnessDaily (UserId, Day, Steps, DistanceKm, IsSynthetic)
-                    VALUES ({uid}, {day:yyyy-MM-dd}, {steps}, {distKm}, 0)
-                    ON DUPLICATE KEY UPDATE
-                        Steps = GREATEST(COALESCE(Steps,0), VALUES(Steps)),
-                        DistanceKm = GREATEST(COALESCE(DistanceKm,0), VALUES(DistanceKm)),
-                        IsSynthetic = 0;
-                ", ct);
-
-                if (affected > 0) upserted++;
-                rows++;
+                // One statement per line, each upserting up to SHEALTH_SQL_BATCH days with the
+                // same keep-max semantics as below; executed as-is in a single transaction.
+                rows = lines.Skip(1).Count(l => !string.IsNullOrWhiteSpace(l));
+                var conn = _db.Database.GetDbConnection();
+                if (conn.State != ConnectionState.Open)
+                    await conn.OpenAsync(ct);
+                await using var tx = await conn.BeginTransactionAsync(ct);
+                foreach (var stmt in await System.IO.File.ReadAllLinesAsync(sqlPath, ct))
+                {
+                    if (string.IsNullOrWhiteSpace(stmt) || stmt.StartsWith("--")) continue;
+                    await using var cmd = conn.CreateCommand();
+                    cmd.Transaction = tx;
+                    cmd.CommandText = stmt;
+                    affectedRows += await cmd.ExecuteNonQueryAsync(ct);
+                    statements++;
+                }
+                await tx.CommitAsync(ct);
+                upserted = rows; // every day in the batch was upserted, same as the per-row loop's count
+            }
+            else
+            {
+                // Import ALL rows (no skipping) — trigger will handle low step days
+                for (int i = 1; i < lines.Length; i++)
+                {
+                    ct.ThrowIfCancellationRequested();
+                    var line = lines[i].Trim();
+                    if (string.IsNullOrWhiteSpace(line)) continue;
+                    var parts = line.Split(',');
+                    if (parts.Length < 3) continue;
+
+                    if (!DateTime.TryParseExact(parts[0].Trim(), "yyyy-MM-dd", CultureInfo.InvariantCulture,
+                                                DateTimeStyles.None, out var dayDt))
+                        continue;
+
+                    var day = DateOnly.FromDateTime(dayDt);
+
+                    int steps = 0;
+                    _ = int.TryParse(parts[1].Trim(), NumberStyles.Integer, CultureInfo.InvariantCulture, out steps);
+
+                    decimal distKm = 0m;
+                    _ = decimal.TryParse(parts[2].Trim(), NumberStyles.Float, CultureInfo.InvariantCulture, out distKm);
+
+                    // Insert or upsert (keep max values)
+                    var affected = await _db.Database.ExecuteSqlInterpolatedAsync($@"
+                        INSERT INTO FitnessDaily (UserId, Day, Steps, DistanceKm, IsSynthetic)
+                        VALUES ({uid}, {day:yyyy-MM-dd}, {steps}, {distKm}, 0)
+                        ON DUPLICATE KEY UPDATE
+                            Steps = GREATEST(COALESCE(Steps,0), VALUES(Steps)),
+                            DistanceKm = GREATEST(COALESCE(DistanceKm,0), VALUES(DistanceKm)),
+                            IsSynthetic = 0;
+                    ", ct);
+
+                    affectedRows += affected;
+                    if (affected > 0) upserted++;
+                    rows++;
+                }
+            }
+
+            // Import succeeded: what we just sent becomes the baseline for the next delta
+            if (isDelta)
+            {
+                var snapshot = Path.Combine(_cfg.RawDir, $".steps_snapshot.{SnapshotKey(uid)}.csv");
+                if (System.IO.File.Exists(snapshot + ".pending"))
+                    System.IO.File.Move(snapshot + ".pending", snapshot, overwrite: true);
             }
 
             return Ok(new
             {
                 processed = 1,
+                mode = isDelta ? "delta" : "full",
+                statements,
                 totalRows = rows,
                 totalUpserted = upserted,
+                affectedRows,
                 csv = csvPath,
-                log = logPath
+                log = logPath,
+                metrics = metricsPath
             });
         }
 
+        // Same sanitising as key_suffix() in shealth_steps_pipeline.py (snapshot, delta and SQL names)
+        private static string SnapshotKey(string key) =>
+            System.Text.RegularExpressions.Regex.Replace(key, "[^a-zA-Z0-9._-]+", "-");
+
         // ---------------- existing single-folder Process() kept as-is below ----------------
         // (If you no longer need it, you can remove it safely.)
     }
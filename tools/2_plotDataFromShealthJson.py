@@ -1,39 +1,92 @@
+import matplotlib
+matplotlib.use("Agg")  # non-interactive: charts are only ever saved to PNG
+
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection
 import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import shealth_rollup
 
-BASE_DIR = r"C:\Users\Matic\Desktop\Samsung Health"
+BASE_DIR = os.environ.get("SHEALTH_PLOT_DIR", r"C:\Users\Matic\Desktop\Samsung Health")
 CSV_FILES = [
     "steps_summary_shealth_fixed.csv",
     "steps_summary_pedometer_fixed.csv"
 ]
 
-def plot_bar_chart(df, x, y, title, xlabel, ylabel, output_path, width=50, height=10, dpi=200, freq='D', source_text=None):
-    plt.figure(figsize=(width, height), dpi=dpi)
-    ax = plt.gca()
+# Rendered-chart manifest: output PNG -> hash of (CSV bytes + plotting parameters)
+CHART_CACHE_PATH = os.path.join(BASE_DIR, ".chart_cache.json")
+CHART_CACHE_VERSION = 1  # bump when the drawing code changes what a chart looks like
+
+# Windowed ("tiled") daily charts: one smaller image per year / quarter
+TILES_DIR = os.path.join(BASE_DIR, "tiles")
+TILE_WINDOWS = {"year": "Y", "quarter": "Q"}
+TILE_LABELS = {"year": r"\d{4}", "quarter": r"\d{4}Q[1-4]"}  # str(period), to tell the windows' files apart
+TILE_SIZES = {"year": (24, 7), "quarter": (12, 7)}  # inches
+TILE_DPI = 120
+
+BAR_COLOR = '#1976d2'
+BAR_EDGE = '#0d47a1'
 
-    # Bar chart
-    plt.bar(df[x], df[y], width=0.8, color='#1976d2', edgecolor='#0d47a1')
+def draw_bars_collection(ax, xs, ys, width=0.8):
+    """
+    Same rectangles as ax.bar(xs, ys, width) but as ONE PolyCollection artist
+    instead of one Rectangle per bar, which is what makes multi-year daily
+    charts slow to build and draw.
+    """
+    x = mdates.date2num(pd.to_datetime(xs).to_numpy()) if len(xs) else np.empty(0)
+    y = np.nan_to_num(np.asarray(ys, dtype=float))
+    left, right = x - width / 2, x + width / 2
+    zero = np.zeros_like(y)
+    verts = np.stack([
+        np.column_stack([left, zero]),
+        np.column_stack([left, y]),
+        np.column_stack([right, y]),
+        np.column_stack([right, zero]),
+    ], axis=1)
+    coll = PolyCollection(verts, facecolors=BAR_COLOR, edgecolors=BAR_EDGE, linewidths=1.0)
+    coll.sticky_edges.y.append(0)  # like bar(): no margin below the baseline
+    ax.add_collection(coll)
+    ax.xaxis_date()
+    ax.autoscale_view()
+    return coll
 
-    plt.title(title, fontsize=36, pad=30)
-    plt.xlabel(xlabel, fontsize=26, labelpad=20)
-    plt.ylabel(ylabel, fontsize=26, labelpad=20)
+def plot_bar_chart(df, x, y, title, xlabel, ylabel, output_path, width=50, height=10, dpi=200, freq='D',
+                   source_text=None, fast=True):
+    fig, ax = plt.subplots(figsize=(width, height), dpi=dpi)
+
+    # Bar chart (daily charts: one collection artist on the fast path)
+    if fast and freq == 'D':
+        draw_bars_collection(ax, df[x], df[y], width=0.8)
+    else:
+        ax.bar(df[x], df[y], width=0.8, color=BAR_COLOR, edgecolor=BAR_EDGE)
+
+    ax.set_title(title, fontsize=36, pad=30)
+    ax.set_xlabel(xlabel, fontsize=26, labelpad=20)
+    ax.set_ylabel(ylabel, fontsize=26, labelpad=20)
 
     # Formatting x-axis
     if freq == 'D':
         ax.xaxis.set_major_locator(mdates.MonthLocator())
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
         ax.xaxis.set_minor_locator(mdates.WeekdayLocator(byweekday=mdates.MO))
-        plt.tick_params(axis='x', which='major', labelsize=18, rotation=45, length=10)
+        ax.tick_params(axis='x', which='major', labelsize=18, rotation=45, length=10)
     elif freq == 'M':
         ax.xaxis.set_major_locator(mdates.MonthLocator())
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-        plt.tick_params(axis='x', which='major', labelsize=24, rotation=45, length=12)
+        ax.tick_params(axis='x', which='major', labelsize=24, rotation=45, length=12)
 
-    plt.tick_params(axis='y', which='major', labelsize=20, length=10)
-    plt.grid(which='major', axis='y', color='#b0bec5', linestyle='-', linewidth=1.3)
-    plt.grid(which='minor', axis='y', color='#cfd8dc', linestyle=':', linewidth=0.6)
+    ax.tick_params(axis='y', which='major', labelsize=20, length=10)
+    ax.grid(which='major', axis='y', color='#b0bec5', linestyle='-', linewidth=1.3)
+    ax.grid(which='minor', axis='y', color='#cfd8dc', linestyle=':', linewidth=0.6)
 
     ax.spines['top'].set_visible(False)
     ax.spines['right'].set_visible(False)
@@ -41,72 +94,246 @@ def plot_bar_chart(df, x, y, title, xlabel, ylabel, output_path, width=50, heigh
     # Add source (CSV path) to the image
     if source_text:
         # Bottom-left corner of the figure
-        plt.figtext(0.01, 0.01, f"Source: {source_text}", ha='left', va='bottom', fontsize=12, color='#546e7a')
+        fig.text(0.01, 0.01, f"Source: {source_text}", ha='left', va='bottom', fontsize=12, color='#546e7a')
 
-    plt.tight_layout(pad=4)
-    plt.savefig(output_path, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout(pad=4)
+    fig.savefig(output_path, bbox_inches='tight')
+    plt.close(fig)
     print(f"Saved: {output_path}")
 
-def process_and_plot(csv_path, prefix):
+def load_daily(csv_path):
     df = pd.read_csv(csv_path)
     df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
+    return df.sort_values('date')
+
+def daily_rollups(df):
+    """shealth_rollup document for a daily frame (monthly chart data, optional rollup file)."""
+    return shealth_rollup.compute_rollups(zip(df['date'].dt.strftime('%Y-%m-%d'), df['steps'], df['distance_km']))
 
+def chart_jobs(csv_path, prefix, fast=True, df=None, rollups=None):
+    """The three charts for one CSV as plot_bar_chart keyword dicts (picklable, data included)."""
+    if df is None:
+        df = load_daily(csv_path)
     source_text = csv_path  # include full path with .csv
 
-    # DAILY STEPS
-    plot_bar_chart(
-        df,
-        x='date',
-        y='steps',
-        title=f"Step Count Per Day ({prefix})",
-        xlabel="Date",
-        ylabel="Steps",
-        output_path=os.path.join(BASE_DIR, f"{prefix}_steps_daily.png"),
-        width=50, height=10, dpi=200, freq='D',
-        source_text=source_text
-    )
-
-    # DAILY DISTANCE
-    plot_bar_chart(
-        df,
-        x='date',
-        y='distance_km',
-        title=f"Distance (km) Per Day ({prefix})",
-        xlabel="Date",
-        ylabel="Distance (km)",
-        output_path=os.path.join(BASE_DIR, f"{prefix}_km_daily.png"),
-        width=50, height=10, dpi=200, freq='D',
-        source_text=source_text
-    )
-
-    # MONTHLY DISTANCE
-    df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-    df_month = df.groupby('month')['distance_km'].sum().reset_index()
-    plot_bar_chart(
-        df_month,
-        x='month',
-        y='distance_km',
-        title=f"Distance (km) Per Month ({prefix})",
-        xlabel="Month",
-        ylabel="Distance (km)",
-        output_path=os.path.join(BASE_DIR, f"{prefix}_km_monthly.png"),
-        width=30, height=10, dpi=200, freq='M',
-        source_text=source_text
-    )
-
-def main():
+    if rollups is None:
+        rollups = daily_rollups(df)
+    df_month = pd.DataFrame({
+        'month': pd.to_datetime(rollups['month']['start']),
+        'distance_km': rollups['month']['distance_km'],
+    })
+
+    return [
+        # DAILY STEPS
+        dict(df=df[['date', 'steps']], x='date', y='steps',
+             title=f"Step Count Per Day ({prefix})", xlabel="Date", ylabel="Steps",
+             output_path=os.path.join(BASE_DIR, f"{prefix}_steps_daily.png"),
+             width=50, height=10, dpi=200, freq='D', source_text=source_text, fast=fast),
+        # DAILY DISTANCE
+        dict(df=df[['date', 'distance_km']], x='date', y='distance_km',
+             title=f"Distance (km) Per Day ({prefix})", xlabel="Date", ylabel="Distance (km)",
+             output_path=os.path.join(BASE_DIR, f"{prefix}_km_daily.png"),
+             width=50, height=10, dpi=200, freq='D', source_text=source_text, fast=fast),
+        # MONTHLY DISTANCE
+        dict(df=df_month, x='month', y='distance_km',
+             title=f"Distance (km) Per Month ({prefix})", xlabel="Month", ylabel="Distance (km)",
+             output_path=os.path.join(BASE_DIR, f"{prefix}_km_monthly.png"),
+             width=30, height=10, dpi=200, freq='M', source_text=source_text, fast=fast),
+    ]
+
+def tile_jobs(csv_path, prefix, window, fast=True, df=None):
+    """
+    Daily steps / distance charts split into one job per calendar window.
+    Returns [(job, window data hash, index entry)]; the hash covers only the
+    window's rows, so new data re-renders just the windows it falls in.
+    """
+    if df is None:
+        df = load_daily(csv_path)
+    width, height = TILE_SIZES[window]
+    out_dir = os.path.join(TILES_DIR, prefix)
+    os.makedirs(out_dir, exist_ok=True)
+    out = []
+    for period, part in df.groupby(df['date'].dt.to_period(TILE_WINDOWS[window])):
+        label = str(period)  # 2024 / 2024Q3
+        for y, name, title, ylabel in (
+            ('steps', 'steps', "Step Count Per Day", "Steps"),
+            ('distance_km', 'km', "Distance (km) Per Day", "Distance (km)"),
+        ):
+            data = part[['date', y]]
+            data_hash = hashlib.sha256(data.to_csv(index=False).encode("utf-8")).hexdigest()
+            file_name = f"{prefix}_{name}_{label}.png"
+            job = dict(df=data, x='date', y=y,
+                       title=f"{title} ({prefix}, {label})", xlabel="Date", ylabel=ylabel,
+                       output_path=os.path.join(out_dir, file_name),
+                       width=width, height=height, dpi=TILE_DPI, freq='D', source_text=csv_path, fast=fast)
+            entry = {
+                "metric": y,
+                "window": label,
+                "start": period.start_time.strftime('%Y-%m-%d'),
+                "end": period.end_time.strftime('%Y-%m-%d'),
+                "first_day": part['date'].iloc[0].strftime('%Y-%m-%d'),
+                "last_day": part['date'].iloc[-1].strftime('%Y-%m-%d'),
+                "days": int(len(part)),
+                "file": file_name,
+            }
+            out.append((job, data_hash, entry))
+    return out
+
+def write_tile_index(prefix, csv_path, window, entries):
+    """
+    tiles/<prefix>/index_<window>.json: every window image with its date range,
+    in date order. This window's images that the index no longer lists (the
+    data stopped covering them) are deleted; the other window's are left alone.
+    """
+    out_dir = os.path.join(TILES_DIR, prefix)
+    path = os.path.join(out_dir, f"index_{window}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"csv": csv_path, "window": window, "charts": entries}, f, indent=2)
+    os.replace(tmp, path)
+    keep = {e["file"] for e in entries}
+    ours = re.compile(rf"{re.escape(prefix)}_(steps|km)_{TILE_LABELS[window]}\.png")
+    for name in sorted(os.listdir(out_dir)):
+        if ours.fullmatch(name) and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+            print(f"Removed: {os.path.join(out_dir, name)} (window no longer in the data)")
+    return path
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def chart_cache_key(csv_hash, job):
+    """Hash of the input CSV content plus every parameter that changes the image."""
+    params = {k: v for k, v in job.items() if k not in ("df", "output_path")}
+    if params.get("freq") != 'D':
+        params.pop("fast", None)  # only daily charts have two drawing paths
+    blob = json.dumps({"v": CHART_CACHE_VERSION, "csv": csv_hash, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ChartCache:
+    """
+    Remembers which inputs produced each PNG. A chart is skipped when its key
+    matches and the PNG still exists; keys are only recorded after a successful
+    render, so an interrupted run re-renders next time.
+    """
+
+    def __init__(self, path, enabled=True):
+        # enabled=False (--rebuild) only bypasses is_fresh: entries are still
+        # loaded so save() keeps the ones for charts this run doesn't render.
+        self.path = path
+        self.enabled = enabled
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("charts", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARN] ignoring unreadable chart cache {path}: {e}")
+
+    def is_fresh(self, output_path, key):
+        fresh = self.enabled and self.entries.get(output_path) == key and os.path.exists(output_path)
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def record(self, output_path, key):
+        self.entries[output_path] = key
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CHART_CACHE_VERSION, "charts": self.entries}, f, indent=2)
+        os.replace(tmp, self.path)
+
+def render_chart(job):
+    """Render one chart; returns (output_path, seconds)."""
+    t0 = time.perf_counter()
+    plot_bar_chart(**job)
+    return job['output_path'], time.perf_counter() - t0
+
+def render_all(jobs, workers=0):
+    """Render every chart job, in worker processes unless workers == 1; returns [(path, seconds)]."""
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [render_chart(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(render_chart, jobs))
+
+def process_and_plot(csv_path, prefix, fast=True):
+    for job in chart_jobs(csv_path, prefix, fast):
+        render_chart(job)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Render step/distance charts from the *_fixed.csv summaries.")
+    ap.add_argument("--workers", type=int, default=0, help="render processes (0 = all cores, 1 = serial)")
+    ap.add_argument("--slow", action="store_true",
+                    help="draw daily bars one rectangle at a time (the old path, for comparison)")
+    ap.add_argument("--rollup", action="store_true",
+                    help="also write <csv>.rollup.json (weekly/monthly/yearly sums, 7/30-day means)")
+    ap.add_argument("--tiles", choices=sorted(TILE_WINDOWS), default=None,
+                    help="render the daily charts as one image per year/quarter into tiles/<csv>/ "
+                         "(with index_<window>.json) instead of the full-width charts")
+    ap.add_argument("--rebuild", action="store_true",
+                    help="ignore the chart cache and re-render everything (entries for other charts are kept)")
+    args = ap.parse_args(argv)
+
     file_map = {
         "steps_summary_shealth_fixed.csv": "Samsung Health (Shealth)",
         "steps_summary_pedometer_fixed.csv": "Samsung Health (Pedometer)",
     }
+    cache = ChartCache(CHART_CACHE_PATH, enabled=not args.rebuild)
+    jobs = []
+    keys = []
     for filename in CSV_FILES:
         csv_path = os.path.join(BASE_DIR, filename)
-        if os.path.exists(csv_path):
-            process_and_plot(csv_path, os.path.splitext(filename)[0])
-        else:
+        if not os.path.exists(csv_path):
             print(f"File not found: {csv_path}")
+            continue
+        csv_hash = file_sha256(csv_path)
+        df = load_daily(csv_path)
+        rollups = daily_rollups(df)
+        if args.rollup:
+            print(f"Saved: {shealth_rollup.write_rollups(rollups, shealth_rollup.rollup_path_for(csv_path))}")
+        prefix = os.path.splitext(filename)[0]
+        if args.tiles:
+            tiles = tile_jobs(csv_path, prefix, args.tiles, fast=not args.slow, df=df)
+            print(f"Saved: {write_tile_index(prefix, csv_path, args.tiles, [t[2] for t in tiles])}")
+            keyed = [(job, chart_cache_key(data_hash, job)) for job, data_hash, _ in tiles]
+        else:
+            keyed = [(job, chart_cache_key(csv_hash, job))
+                     for job in chart_jobs(csv_path, prefix, fast=not args.slow, df=df, rollups=rollups)]
+        for job, key in keyed:
+            if cache.is_fresh(job['output_path'], key):
+                if not args.tiles:
+                    print(f"Unchanged: {job['output_path']}")
+                continue
+            jobs.append(job)
+            keys.append(key)
+    print(f"[INFO] chart cache: {cache.hits} hit(s), {cache.misses} miss(es)"
+          + (" (--rebuild)" if args.rebuild else ""))
+    if not jobs:
+        return
+
+    t0 = time.perf_counter()
+    timings = render_all(jobs, args.workers)
+    wall = time.perf_counter() - t0
+    for job, key in zip(jobs, keys):
+        cache.record(job['output_path'], key)
+    cache.save()
+    print(f"\n{'render_s':>9}  chart ({'per-bar' if args.slow else 'collection'} path)")
+    for path, secs in timings:
+        print(f"{secs:>9.2f}  {os.path.basename(path)}")
+    print(f"{sum(s for _, s in timings):>9.2f}  total chart time, {wall:.2f}s wall")
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,56 @@
 # batch_fbx_to_gltf.py
 # Usage:
 #   blender.exe -b -P batch_fbx_to_gltf.py -- "INPUT_DIR" ["OUTPUT_DIR"]
+#   python batch_fbx_to_gltf.py "INPUT_DIR" ["OUTPUT_DIR"] [-j N] [--blender PATH]
 #
-# Converts every .fbx in INPUT_DIR to .glb (glTF-Binary).
-# If OUTPUT_DIR is omitted, .glb files are written next to the .fbx files.
+# Converts every .fbx under INPUT_DIR (recursively) to .glb (glTF-Binary),
+# mirroring the folder layout into OUTPUT_DIR. If OUTPUT_DIR is omitted, .glb
+# files are written next to the .fbx files.
+#
+# Incremental: OUTPUT_DIR/.fbx_manifest.json records each source's SHA-256 and
+# the export settings it was converted with. A file is only converted again
+# when its content or the settings changed (or its .glb is missing; --force
+# converts everything). GLBs whose .fbx was deleted are pruned.
+#
+# Run inside Blender it converts the files itself, one after another. Run with
+# a plain Python it is a driver: the files are split into N shards (default:
+# one per core) and N headless Blender workers convert them concurrently. A
+# file that fails (or crashes its Blender) is recorded and the rest continue;
+# the driver ends with one combined summary (also written as
+# OUTPUT_DIR/fbx_convert_summary.json).
+#
+# --split-rig (either mode): clips that share an identical armature + mesh
+# are exported as ONE base GLB with the rigged mesh in rest pose
+# (OUTPUT_DIR/_rigs/rig_<rig hash>_<settings hash>.glb) plus one animation-only <clip>.anim.glb
+# per FBX (skeleton nodes + animation, no mesh/skin/textures). Clients load
+# the base once and bind each clip to it by bone name.
+# OUTPUT_DIR/animation_index.json maps every clip to its base.
+# check_split_rig_glb.py verifies that clips bind to their base by node name
+# (its --make-example writes sample FBX input for that).
+#
+# --sweep (either mode): instead of converting, import each FBX once and
+# export it at every combination of --sweep-draco / --sweep-images /
+# --sweep-anim-opt into OUTPUT_DIR/_sweep/<file>/<variant>.glb, recording
+# bytes, export wall time and peak memory (sampled per export) per variant in
+# OUTPUT_DIR/fbx_sweep_report.csv + .json. Per file the smallest variant
+# whose export fits --time-budget is picked (only picked GLBs are kept unless
+# --keep-sweep). The manifest and the normal outputs are not touched.
 
-import bpy
 import os
 import sys
+import json
+import time
+import array
+import hashlib
 import pathlib
+import argparse
+import threading
+import tracemalloc
+
+try:
+    import bpy  # only available inside Blender
+except ImportError:
+    bpy = None
 
 # ---------- Config you can tweak ----------
 DRACO = True            # set False to disable Draco mesh compression
@@ -16,8 +58,20 @@ DRACO_LEVEL = 6         # 0 (fast) .. 10 (small)
 EMBED_TEXTURES = True   # GLB embeds textures by default; keep True
 EXPORT_ANIMS = True     # export animations (recommended for FBX clips)
 APPLY_TRANSFORMS = True # apply object transforms on export
+SPLIT_RIG = False       # shared base GLB + animation-only clip GLBs (--split-rig)
+BLENDER = os.environ.get("BLENDER", "blender")  # driver: Blender executable
+SWEEP_DRACO_LEVELS = "off,0,3,6,10"          # --sweep-draco ("off" = no Draco)
+SWEEP_IMAGE_FORMATS = "AUTO,JPEG,WEBP"       # --sweep-images
+SWEEP_OPTIMIZE_ANIMATION = "1,0"             # --sweep-anim-opt
 # ------------------------------------------
 
+MANIFEST_NAME = ".fbx_manifest.json"
+MANIFEST_VERSION = 1
+RIGS_DIR = "_rigs"
+ANIMATION_INDEX_NAME = "animation_index.json"
+SWEEP_DIR = "_sweep"
+SWEEP_REPORT_NAME = "fbx_sweep_report"  # .csv + .json
+
 def reset_scene():
     # Reset to an empty factory scene before each file to avoid data piling up
     bpy.ops.wm.read_factory_settings(use_empty=True)
@@ -29,7 +83,7 @@ def import_fbx(fpath: str):
         use_anim=True
     )
 
-def export_glb(out_path: str):
+def export_glb(out_path: str, **overrides):
     # Base export options
     kw = dict(
         filepath=out_path,
@@ -54,46 +108,805 @@ def export_glb(out_path: str):
             export_draco_mesh_compression_enable=True,
             export_draco_mesh_compression_level=DRACO_LEVEL
         )
+    kw.update(overrides)
 
     bpy.ops.export_scene.gltf(**kw)
 
 def ensure_dir(p: str):
     os.makedirs(p, exist_ok=True)
 
-def main():
-    # Parse args after --
-    argv = sys.argv
-    if "--" in argv:
-        argv = argv[argv.index("--") + 1:]
+def find_fbx_files(in_dir: str):
+    """Every .fbx under in_dir, recursively (hidden folders skipped)."""
+    found = []
+    for root, dirs, files in os.walk(in_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".fbx"))
+    return sorted(found)
+
+def glb_path_for(fbx: str, in_dir: str, out_dir: str, suffix: str = ".glb"):
+    """Same relative folder under out_dir, .fbx -> .glb (or .anim.glb for split clips)."""
+    rel = os.path.relpath(fbx, in_dir)
+    return os.path.join(out_dir, os.path.splitext(rel)[0] + suffix)
+
+# ---------- Manifest (incremental conversion) ----------
+
+def export_settings():
+    """Everything in the config block that changes the exported file."""
+    return {
+        "DRACO": DRACO,
+        "DRACO_LEVEL": DRACO_LEVEL,
+        "EMBED_TEXTURES": EMBED_TEXTURES,
+        "EXPORT_ANIMS": EXPORT_ANIMS,
+        "APPLY_TRANSFORMS": APPLY_TRANSFORMS,
+        "SPLIT_RIG": SPLIT_RIG,
+    }
+
+def settings_hash():
+    return hashlib.sha256(json.dumps(export_settings(), sort_keys=True).encode("utf-8")).hexdigest()[:8]
+
+def file_sha256(path: str):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(out_dir: str):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        if doc.get("version") == MANIFEST_VERSION and isinstance(doc.get("files"), dict):
+            return doc
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Ignoring unreadable manifest {path}: {e}")
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+def save_manifest(out_dir: str, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def plan_conversions(in_dir: str, out_dir: str, fbx_files, manifest, force=False):
+    """
+    Returns (todo, sources, stale): the files to convert, {fbx: (sha256, stat)}
+    for them, and manifest keys whose .fbx no longer exists. Size + mtime
+    unchanged means unchanged; otherwise the content hash decides, so a file
+    that was only touched or copied is not reconverted.
+    """
+    settings = export_settings()
+    entries = manifest["files"]
+    todo, sources, seen = [], {}, set()
+    for fbx in fbx_files:
+        rel = os.path.relpath(fbx, in_dir)
+        seen.add(rel)
+        st = os.stat(fbx)
+        ent = entries.get(rel)
+        reusable = (not force and ent is not None and ent.get("settings") == settings
+                    and os.path.exists(os.path.join(out_dir, ent["out"]))
+                    and (not ent.get("rig", {}).get("base")
+                         or os.path.exists(os.path.join(out_dir, ent["rig"]["base"]))))
+        if reusable and ent["size"] == st.st_size and ent["mtime_ns"] == st.st_mtime_ns:
+            continue
+        sha = file_sha256(fbx)
+        if reusable and ent["sha256"] == sha:
+            ent.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            continue
+        todo.append(fbx)
+        sources[fbx] = (sha, st)
+    stale = sorted(rel for rel in entries if rel not in seen)
+    return todo, sources, stale
+
+def prune_outputs(out_dir: str, manifest, stale):
+    """Delete the GLBs of sources that disappeared and drop them from the manifest."""
+    for rel in stale:
+        ent = manifest["files"].pop(rel)
+        out = os.path.join(out_dir, ent["out"])
+        if os.path.exists(out):
+            os.remove(out)
+            print(f"Pruned: {out} (source {rel} deleted)")
+        parent = os.path.dirname(out)
+        while parent != out_dir and os.path.isdir(parent) and not os.listdir(parent):
+            os.rmdir(parent)  # mirrored folder is now empty
+            parent = os.path.dirname(parent)
+
+def record_results(in_dir: str, out_dir: str, manifest, records, sources):
+    """Successful conversions become manifest entries; failed ones are dropped so they retry."""
+    settings = export_settings()
+    for r in records:
+        rel = os.path.relpath(r["file"], in_dir)
+        if not r["ok"] or r["file"] not in sources:
+            manifest["files"].pop(rel, None)
+            continue
+        sha, st = sources[r["file"]]
+        old = manifest["files"].get(rel)
+        out_rel = os.path.relpath(r["out"], out_dir)
+        if old and old["out"] != out_rel and os.path.exists(os.path.join(out_dir, old["out"])):
+            # e.g. --split-rig toggled: clip.glb <-> clip.anim.glb
+            os.remove(os.path.join(out_dir, old["out"]))
+        manifest["files"][rel] = {
+            "sha256": sha,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "settings": settings,
+            "out": out_rel,
+        }
+        if "rig" in r:
+            manifest["files"][rel]["rig"] = r["rig"]
+
+# ---------- Shared-rig split ----------
+
+def _armatures():
+    return sorted((o for o in bpy.data.objects if o.type == 'ARMATURE'), key=lambda o: o.name)
+
+def rig_signature():
+    """
+    Hash of what a base GLB would contain: bone names/parents/rest matrices,
+    mesh names, topology sizes, rest vertex positions and material names
+    (rounded to 1e-4, so float noise between exports doesn't split a rig).
+    None when the scene has no armature.
+    """
+    arms = _armatures()
+    if not arms:
+        return None, {}
+    h = hashlib.sha256()
+    bones = 0
+    for arm in arms:
+        h.update(arm.name.encode("utf-8"))
+        for b in sorted(arm.data.bones, key=lambda b: b.name):
+            bones += 1
+            h.update(f"{b.name}|{b.parent.name if b.parent else ''}|".encode("utf-8"))
+            h.update(array.array("f", (round(v, 4) for row in b.matrix_local for v in row)).tobytes())
+    for ob in sorted((o for o in bpy.data.objects if o.type == 'MESH'), key=lambda o: o.name):
+        me = ob.data
+        h.update(f"{ob.name}|{len(me.vertices)}|{len(me.polygons)}|".encode("utf-8"))
+        co = array.array("f", [0.0]) * (len(me.vertices) * 3)
+        me.vertices.foreach_get("co", co)
+        h.update(array.array("f", (round(c, 4) for c in co)).tobytes())
+        h.update("|".join(sorted(m.name for m in me.materials if m)).encode("utf-8"))
+    scene = bpy.context.scene
+    # the FBX importer leaves the scene range at its default, so use the actions' own keys
+    ranges = [tuple(a.frame_range) for a in bpy.data.actions]
+    info = {
+        "bones": bones,
+        "actions": sorted(a.name for a in bpy.data.actions),
+        "frames": [round(min(r[0] for r in ranges), 3), round(max(r[1] for r in ranges), 3)] if ranges
+                  else [scene.frame_start, scene.frame_end],
+        "fps": scene.render.fps / scene.render.fps_base,
+    }
+    return h.hexdigest(), info
+
+def export_base_glb(base_path: str):
+    """Rigged mesh in rest pose, no animation. Written via a temp file (workers may race)."""
+    arms = _armatures()
+    for arm in arms:
+        arm.data.pose_position = 'REST'
+    tmp = f"{base_path[:-4]}.{os.getpid()}.tmp.glb"
+    try:
+        export_glb(tmp, export_animations=False)
+        os.replace(tmp, base_path)
+    finally:
+        for arm in arms:
+            arm.data.pose_position = 'POSE'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def export_clip_glb(out_path: str):
+    """Only the armature(s): skeleton nodes + animations, no mesh, skin or textures."""
+    bpy.ops.object.select_all(action='DESELECT')
+    for arm in _armatures():
+        arm.select_set(True)
+    export_glb(out_path, use_selection=True, export_skins=False, export_morph=False,
+               export_materials='NONE')
+
+def write_animation_index(out_dir: str, manifest):
+    """
+    animation_index.json from the manifest (covers files converted in earlier
+    runs too): bases with their clips, every clip with its base. Base GLBs no
+    clip refers to any more are deleted.
+    """
+    bases, clips, standalone = {}, [], []
+    for rel, ent in sorted(manifest["files"].items()):
+        rig = ent.get("rig")
+        if rig is None:
+            continue
+        out = ent["out"].replace(os.sep, "/")
+        if not rig.get("base"):
+            standalone.append({"source": rel.replace(os.sep, "/"), "file": out})
+            continue
+        base = bases.setdefault(rig["base"], {
+            "file": rig["base"], "signature": rig["signature"], "bones": rig["bones"], "clips": [],
+        })
+        base["clips"].append(out)
+        clips.append({
+            "name": pathlib.Path(rel).stem,
+            "source": rel.replace(os.sep, "/"),
+            "file": out,
+            "base": rig["base"],
+            "actions": rig["actions"],
+            "frames": rig["frames"],
+            "fps": rig["fps"],
+        })
+    rigs_dir = os.path.join(out_dir, RIGS_DIR)
+    if os.path.isdir(rigs_dir):
+        for name in os.listdir(rigs_dir):
+            if name.endswith(".glb") and f"{RIGS_DIR}/{name}" not in bases:
+                os.remove(os.path.join(rigs_dir, name))
+                print(f"Pruned: unused base {name}")
+    path = os.path.join(out_dir, ANIMATION_INDEX_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"bases": list(bases.values()), "clips": clips, "standalone": standalone}, f, indent=2)
+    print(f"Index: {path} ({len(bases)} base(s), {len(clips)} clip(s), {len(standalone)} standalone)")
+    return path
+
+def convert_one(fbx: str, out_path: str, out_dir: str = None, rebuilt=None):
+    """
+    Convert one file; never raises. Returns a result record for the summary.
+    With --split-rig, `rebuilt` (a set, under --force) forces each shared base
+    to be exported again once per run.
+    """
+    t0 = time.perf_counter()
+    rec = {"file": fbx, "out": out_path}
+    tmp = None
+    try:
+        ensure_dir(os.path.dirname(out_path))
+        reset_scene()
+        import_fbx(fbx)
+        # Example: set FPS if needed
+        # bpy.context.scene.render.fps = 30
+        export = export_glb
+        if SPLIT_RIG:
+            sig, info = rig_signature()
+            if sig is None:
+                # nothing to share: full GLB under the plain name
+                out_path = rec["out"] = out_path[:-len(".anim.glb")] + ".glb"
+                rec["rig"] = {"base": None}
+            else:
+                # settings in the name: a config change gets new bases, the old ones are pruned
+                base_name = f"rig_{sig[:16]}_{settings_hash()}.glb"
+                base_rel = f"{RIGS_DIR}/{base_name}"
+                base_path = os.path.join(out_dir, RIGS_DIR, base_name)
+                if not os.path.exists(base_path) or (rebuilt is not None and base_path not in rebuilt):
+                    ensure_dir(os.path.dirname(base_path))
+                    export_base_glb(base_path)
+                    rec["base_bytes"] = os.path.getsize(base_path)
+                    if rebuilt is not None:
+                        rebuilt.add(base_path)
+                export = export_clip_glb
+                rec["rig"] = {"base": base_rel, "signature": sig, **info}
+        # export next to the target and swap it in, so a failure keeps the previous GLB
+        tmp = f"{out_path[:-4]}.{os.getpid()}.tmp.glb"
+        export(tmp)
+        os.replace(tmp, out_path)
+        rec.update(ok=True, bytes=os.path.getsize(out_path))
+    except Exception as e:
+        rec.update(ok=False, error=f"{type(e).__name__}: {e}")
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)  # don't leave a half-written GLB behind
+    rec["seconds"] = round(time.perf_counter() - t0, 3)
+    return rec
+
+# ---------- Sweep: output size vs. export cost per setting ----------
+
+def current_rss_bytes():
+    """Resident set size right now (psutil, /proc, or the Win32 API), or None where it can't be read."""
+    try:
+        import psutil  # not bundled with Blender's Python
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class Counters(ctypes.Structure):  # PROCESS_MEMORY_COUNTERS
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                        "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+            counters = Counters(cb=ctypes.sizeof(Counters))
+            if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+    except (OSError, AttributeError, ValueError):
+        pass
+    return None
+
+class RssSampler:
+    """
+    Samples the process RSS on a background thread while the block runs.
+    `peak` is the highest sample and `increase` is that peak over the RSS at
+    entry, so each export gets its own figure. ru_maxrss would only give the
+    process-lifetime high-water mark. A native call that holds the GIL can't
+    be sampled inside, so a spike it frees before returning can be missed.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss_bytes()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+    @property
+    def increase(self):
+        return None if self.baseline is None else self.peak - self.baseline
+
+def add_sweep_args(ap):
+    ap.add_argument("--sweep", action="store_true",
+                    help="export every file at each setting combination and report size/time/memory")
+    ap.add_argument("--sweep-draco", default=SWEEP_DRACO_LEVELS,
+                    help=f"Draco levels, 'off' = none (default {SWEEP_DRACO_LEVELS})")
+    ap.add_argument("--sweep-images", default=SWEEP_IMAGE_FORMATS,
+                    help=f"export_image_format values (default {SWEEP_IMAGE_FORMATS})")
+    ap.add_argument("--sweep-anim-opt", default=SWEEP_OPTIMIZE_ANIMATION,
+                    help=f"export_optimize_animation_size values, 1/0 (default {SWEEP_OPTIMIZE_ANIMATION})")
+
+def sweep_worker_args(args):
+    """The sweep flags a driver passes on to its Blender workers."""
+    return ["--sweep", "--sweep-draco", args.sweep_draco, "--sweep-images", args.sweep_images,
+            "--sweep-anim-opt", args.sweep_anim_opt]
+
+def sweep_variants(args):
+    """Every combination of the sweep settings, e.g. {"name": "draco6_jpeg_animopt", ...}."""
+    split = lambda v: [x.strip() for x in v.split(",") if x.strip()]
+    levels = [None if x.lower() == "off" else int(x) for x in split(args.sweep_draco)]
+    images = [x.upper() for x in split(args.sweep_images)]
+    anim_opt = [x.lower() in ("1", "true", "yes", "on") for x in split(args.sweep_anim_opt)]
+    variants = []
+    for level in levels:
+        for image in images:
+            for opt in anim_opt:
+                variants.append({
+                    "name": f"{'nodraco' if level is None else f'draco{level}'}_{image.lower()}_"
+                            f"{'animopt' if opt else 'animraw'}",
+                    "draco_level": level,
+                    "image_format": image,
+                    "optimize_animation": opt,
+                })
+    return variants
+
+def sweep_dir_for(fbx: str, in_dir: str, out_dir: str):
+    rel = os.path.relpath(fbx, in_dir)
+    return os.path.join(out_dir, SWEEP_DIR, os.path.splitext(rel)[0])
+
+def sweep_one(fbx: str, sweep_dir: str, variants):
+    """
+    Import once, export once per variant; never raises. Each variant row has
+    the GLB bytes, export seconds, the exporter's traced Python peak (the
+    glTF exporter is Python; Draco's encoder is native and only shows in RSS)
+    and the sampled RSS peak during that export and its increase over the
+    RSS before it.
+    """
+    t0 = time.perf_counter()
+    rec = {"file": fbx, "out": sweep_dir, "variants": []}
+    try:
+        ensure_dir(sweep_dir)
+        reset_scene()
+        import_fbx(fbx)
+    except Exception as e:
+        rec.update(ok=False, error=f"{type(e).__name__}: {e}", seconds=round(time.perf_counter() - t0, 3))
+        return rec
+    rec["import_s"] = round(time.perf_counter() - t0, 3)
+
+    tracemalloc.start()
+    try:
+        for v in variants:
+            path = os.path.join(sweep_dir, v["name"] + ".glb")
+            row = {"variant": v["name"], "draco_level": v["draco_level"], "image_format": v["image_format"],
+                   "optimize_animation": v["optimize_animation"]}
+            tracemalloc.reset_peak()
+            t1 = time.perf_counter()
+            with RssSampler() as rss:
+                try:
+                    export_glb(path,
+                               export_image_format=v["image_format"],
+                               export_optimize_animation_size=v["optimize_animation"],
+                               export_draco_mesh_compression_enable=v["draco_level"] is not None,
+                               export_draco_mesh_compression_level=v["draco_level"] or 0)
+                    row.update(ok=True, bytes=os.path.getsize(path))
+                except Exception as e:
+                    row.update(ok=False, error=f"{type(e).__name__}: {e}")
+                    if os.path.exists(path):
+                        os.remove(path)
+            row["export_s"] = round(time.perf_counter() - t1, 3)
+            row["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            row["rss_peak_bytes"] = rss.peak
+            row["rss_increase_bytes"] = rss.increase
+            rec["variants"].append(row)
+    finally:
+        tracemalloc.stop()
+    failed = [row for row in rec["variants"] if not row["ok"]]
+    rec["ok"] = len(failed) < len(rec["variants"])
+    if not rec["ok"]:
+        rec["error"] = failed[0]["error"] if failed else "no variants"
+    rec["seconds"] = round(time.perf_counter() - t0, 3)
+    return rec
+
+def pick_variant(rec, budget=None):
+    """Smallest successful variant whose export took at most `budget` seconds (None: no limit)."""
+    fits = [row for row in rec.get("variants", [])
+            if row["ok"] and (budget is None or row["export_s"] <= budget)]
+    return min(fits, key=lambda row: (row["bytes"], row["export_s"]), default=None)
+
+SWEEP_COLUMNS = ["file", "variant", "draco_level", "image_format", "optimize_animation", "ok", "bytes",
+                 "export_s", "traced_peak_bytes", "rss_peak_bytes", "rss_increase_bytes", "picked", "error"]
+
+def write_sweep_report(in_dir: str, out_dir: str, records, variants, budget=None, keep=False):
+    """
+    fbx_sweep_report.csv (one row per file x variant) and .json (rows, picks,
+    per-variant totals). Unpicked sweep GLBs are deleted unless keep.
+    """
+    import csv
+
+    rows, picks = [], {}
+    for rec in sorted(records, key=lambda r: r["file"]):
+        rel = os.path.relpath(rec["file"], in_dir)
+        pick = pick_variant(rec, budget)
+        picks[rel] = dict(pick, glb=os.path.relpath(os.path.join(rec["out"], pick["variant"] + ".glb"), out_dir)) \
+            if pick else None
+        if not rec.get("variants"):
+            rows.append({"file": rel, "ok": False, "picked": False, "error": rec.get("error")})
+        for row in rec.get("variants", []):
+            picked = pick is not None and row["variant"] == pick["variant"]
+            rows.append({"file": rel, **row, "picked": picked})
+            path = os.path.join(rec["out"], row["variant"] + ".glb")
+            if not keep and not picked and os.path.exists(path):
+                os.remove(path)
+
+    totals = {}
+    for v in variants:
+        done = [r for r in rows if r.get("variant") == v["name"] and r["ok"]]
+        totals[v["name"]] = {
+            "files": len(done),
+            "bytes": sum(r["bytes"] for r in done),
+            "export_s": round(sum(r["export_s"] for r in done), 3),
+            "max_traced_peak_bytes": max((r["traced_peak_bytes"] for r in done), default=None),
+            "max_rss_increase_bytes": max((r["rss_increase_bytes"] for r in done
+                                           if r.get("rss_increase_bytes") is not None), default=None),
+            "picked": sum(1 for r in rows if r.get("variant") == v["name"] and r["picked"]),
+        }
+
+    base = os.path.join(out_dir, SWEEP_REPORT_NAME)
+    with open(base + ".csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SWEEP_COLUMNS, restval="", extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"time_budget_s": budget, "variants": variants, "totals": totals,
+                   "picks": picks, "rows": rows}, f, indent=2)
+
+    print(f"\n{'bytes':>12} {'export_s':>9} {'picked':>6}  variant (all files)")
+    for name, t in sorted(totals.items(), key=lambda kv: kv[1]["bytes"] if kv[1]["files"] else float("inf")):
+        print(f"{t['bytes']:>12} {t['export_s']:>9.2f} {t['picked']:>6}  {name}"
+              + ("" if t["files"] == len(records) else f"  ({len(records) - t['files']} failed)"))
+    unpicked = [rel for rel, p in picks.items() if p is None]
+    if unpicked:
+        print(f"No variant fits the time budget (or none succeeded) for {len(unpicked)} file(s): "
+              + ", ".join(unpicked[:5]) + (" ..." if len(unpicked) > 5 else ""))
+    print(f"Sweep report: {base}.csv, {base}.json")
+    return picks
+
+def blender_sweep(args, in_dir: str, out_dir: str):
+    """--sweep inside Blender: a driver's shard (--files) or, standalone, every FBX plus the report."""
+    variants = sweep_variants(args)
+    if args.files:
+        with open(args.files, encoding="utf-8") as f:
+            fbx_files = [line.rstrip("\n") for line in f if line.strip()]
     else:
-        argv = []
+        fbx_files = find_fbx_files(in_dir)
+    print(f"Sweeping {len(fbx_files)} FBX files x {len(variants)} settings.")
+    report = open(args.report, "a", encoding="utf-8") if args.report else None
+    records = []
+    for i, fbx in enumerate(fbx_files, start=1):
+        print(f"[{i}/{len(fbx_files)}] {pathlib.Path(fbx).stem}")
+        rec = sweep_one(fbx, sweep_dir_for(fbx, in_dir, out_dir), variants)
+        records.append(rec)
+        if not rec["ok"]:
+            print(f"  FAILED: {rec['error']}")
+        if report:
+            report.write(json.dumps(rec) + "\n")
+            report.flush()
+    if report:
+        report.close()
+    if not args.files:
+        write_sweep_report(in_dir, out_dir, records, variants, args.time_budget, args.keep_sweep)
 
-    if not argv:
-        print("Usage: blender -b -P batch_fbx_to_gltf.py -- INPUT_DIR [OUTPUT_DIR]")
-        sys.exit(1)
+# ---------- Inside Blender: convert (a shard of) the files ----------
+
+def blender_main(argv):
+    ap = argparse.ArgumentParser(prog="blender -b -P batch_fbx_to_gltf.py --")
+    ap.add_argument("in_dir")
+    ap.add_argument("out_dir", nargs="?")
+    ap.add_argument("--files", help="text file with the FBX paths to convert (one per line)")
+    ap.add_argument("--report", help="append one JSON line per converted file here")
+    ap.add_argument("--force", action="store_true", help="convert everything, ignoring the manifest")
+    ap.add_argument("--split-rig", action="store_true", help="shared base GLB + animation-only clip GLBs")
+    add_sweep_args(ap)
+    ap.add_argument("--time-budget", type=float, default=None,
+                    help="sweep: pick the smallest variant exporting within this many seconds")
+    ap.add_argument("--keep-sweep", action="store_true", help="sweep: keep every variant's GLB")
+    args = ap.parse_args(argv)
 
-    in_dir = os.path.abspath(argv[0])
-    out_dir = os.path.abspath(argv[1]) if len(argv) > 1 else in_dir
+    global SPLIT_RIG
+    SPLIT_RIG = SPLIT_RIG or args.split_rig
+    suffix = ".anim.glb" if SPLIT_RIG else ".glb"
+    in_dir = os.path.abspath(args.in_dir)
+    out_dir = os.path.abspath(args.out_dir) if args.out_dir else in_dir
     ensure_dir(out_dir)
+    if args.sweep:
+        blender_sweep(args, in_dir, out_dir)
+        return
 
-    fbx_files = sorted(str(p) for p in pathlib.Path(in_dir).glob("*.fbx"))
+    manifest = None
+    if args.files:
+        # a driver's shard: the driver owns the manifest
+        with open(args.files, encoding="utf-8") as f:
+            fbx_files = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        all_files = find_fbx_files(in_dir)
+        manifest = load_manifest(out_dir)
+        fbx_files, sources, stale = plan_conversions(in_dir, out_dir, all_files, manifest, args.force)
+        prune_outputs(out_dir, manifest, stale)
+        print(f"Found {len(all_files)} FBX files in {in_dir}; {len(all_files) - len(fbx_files)} up to date.")
     if not fbx_files:
-        print(f"No .fbx files found in {in_dir}")
+        if manifest is not None:
+            save_manifest(out_dir, manifest)
+            if SPLIT_RIG:
+                write_animation_index(out_dir, manifest)
+        print(f"Nothing to convert in {in_dir}")
         sys.exit(0)
 
-    print(f"Found {len(fbx_files)} FBX files in {in_dir}.")
+    print(f"Converting {len(fbx_files)} FBX files.")
+    report = open(args.report, "a", encoding="utf-8") if args.report else None
+    rebuilt = set() if args.force else None
+    failed = 0
     for i, fbx in enumerate(fbx_files, start=1):
-        name = pathlib.Path(fbx).stem
-        out_path = os.path.join(out_dir, f"{name}.glb")
-        print(f"[{i}/{len(fbx_files)}] {name} -> {out_path}")
+        out_path = glb_path_for(fbx, in_dir, out_dir, suffix)
+        print(f"[{i}/{len(fbx_files)}] {pathlib.Path(fbx).stem} -> {out_path}")
+        rec = convert_one(fbx, out_path, out_dir, rebuilt)
+        if manifest is not None:
+            # saved per file, so a Blender crash later on keeps the work done so far
+            record_results(in_dir, out_dir, manifest, [rec], sources)
+            save_manifest(out_dir, manifest)
+        if not rec["ok"]:
+            failed += 1
+            print(f"  FAILED: {rec['error']}")
+        if report:
+            report.write(json.dumps(rec) + "\n")
+            report.flush()  # the driver reads this even if Blender dies on the next file
+    if report:
+        report.close()
+    if manifest is not None and SPLIT_RIG:
+        write_animation_index(out_dir, manifest)
 
-        reset_scene()
-        import_fbx(fbx)
-        # Example: set FPS if needed
-        # bpy.context.scene.render.fps = 30
-        export_glb(out_path)
+    print(f"Done. {len(fbx_files) - failed} converted, {failed} failed.")
+
+# ---------- Plain Python: run N Blender workers over shards ----------
+
+def plan_shards(files, n):
+    """Split files into n shards of similar total size (largest file first onto the lightest shard)."""
+    shards = [[] for _ in range(max(1, n))]
+    loads = [0] * len(shards)
+    for f in sorted(files, key=lambda p: os.path.getsize(p), reverse=True):
+        k = loads.index(min(loads))
+        shards[k].append(f)
+        loads[k] += os.path.getsize(f)
+    return [s for s in shards if s]
+
+def _read_report(path):
+    recs = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    recs.append(json.loads(line))
+                except ValueError:
+                    pass  # torn last line of a crashed worker
+    except FileNotFoundError:
+        pass
+    return recs
+
+def run_shard(blender, in_dir, out_dir, files, work_dir, k, out_for, extra=()):
+    """
+    Convert one shard in a headless Blender. If Blender itself dies, the file
+    it was on is recorded as failed (with out_for(fbx) as its output) and a
+    fresh Blender continues after it.
+    """
+    import subprocess
+
+    records = []
+    pending = list(files)
+    attempt = 0
+    while pending:
+        attempt += 1
+        list_path = os.path.join(work_dir, f"shard{k}.{attempt}.txt")
+        report_path = os.path.join(work_dir, f"shard{k}.{attempt}.jsonl")
+        log_path = os.path.join(work_dir, f"shard{k}.{attempt}.log")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(pending) + "\n")
+        with open(log_path, "w", encoding="utf-8") as log:
+            proc = subprocess.run(
+                [blender, "-b", "--factory-startup", "-P", os.path.abspath(__file__), "--",
+                 in_dir, out_dir, "--files", list_path, "--report", report_path, *extra],
+                stdout=log, stderr=subprocess.STDOUT,
+            )
+        got = _read_report(report_path)
+        records.extend(got)
+        done = {r["file"] for r in got}
+        pending = [f for f in pending if f not in done]
+        if not pending:
+            break
+        # Blender exited before reporting the next file: blame that file, go on with the rest
+        with open(log_path, encoding="utf-8", errors="replace") as log:
+            tail = log.read()[-600:]
+        records.append({
+            "file": pending[0], "out": out_for(pending[0]), "ok": False, "seconds": None,
+            "error": f"Blender exited with code {proc.returncode} while converting; log tail:\n{tail}",
+        })
+        pending = pending[1:]
+    return records
 
-    print("Done.")
+def summarize(records, wall, workers, out_dir):
+    ok = [r for r in records if r["ok"]]
+    failed = [r for r in records if not r["ok"]]
+    busy = sum(r["seconds"] or 0 for r in records)
+    summary = {
+        "workers": workers,
+        "files": len(records),
+        "converted": len(ok),
+        "failed": len(failed),
+        "wall_s": round(wall, 3),
+        "convert_s": round(busy, 3),
+        "output_bytes": sum(r.get("bytes", 0) for r in ok),
+        "results": sorted(records, key=lambda r: r["file"]),
+    }
+    path = os.path.join(out_dir, "fbx_convert_summary.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{len(ok)} converted, {len(failed)} failed, {workers} Blender worker(s): "
+          f"{wall:.1f}s wall, {busy:.1f}s of conversion")
+    for r in sorted(ok, key=lambda r: r["seconds"], reverse=True)[:5]:
+        print(f"  {r['seconds']:>8.2f}s  {os.path.basename(r['file'])}")
+    for r in failed:
+        print(f"  FAILED  {os.path.basename(r['file'])}: {r['error'].splitlines()[0]}")
+    print(f"Summary: {path}")
+    return summary
+
+def run_shards(blender, in_dir, out_dir, shards, out_for, extra=()):
+    """One Blender worker per shard, concurrently; returns every worker's records."""
+    from concurrent.futures import ThreadPoolExecutor
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix="fbx2glb_") as work_dir:
+        with ThreadPoolExecutor(max_workers=len(shards)) as ex:
+            futures = [ex.submit(run_shard, blender, in_dir, out_dir, shard, work_dir, k, out_for, extra)
+                       for k, shard in enumerate(shards)]
+            return [r for fut in futures for r in fut.result()]
+
+def driver_sweep(args, in_dir: str, out_dir: str):
+    """--sweep: every FBX (no manifest), sharded over workers, then one combined report."""
+    variants = sweep_variants(args)
+    fbx_files = find_fbx_files(in_dir)
+    if not fbx_files:
+        print(f"Nothing to sweep in {in_dir}")
+        return 0
+    workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(fbx_files))
+    shards = plan_shards(fbx_files, workers)
+    print(f"Sweeping {len(fbx_files)} FBX files x {len(variants)} settings with {len(shards)} Blender worker(s).")
+    # concurrent workers share the machine: export times are comparable with each other, not with -j 1
+    t0 = time.perf_counter()
+    records = run_shards(args.blender, in_dir, out_dir, shards,
+                         lambda fbx: sweep_dir_for(fbx, in_dir, out_dir), sweep_worker_args(args))
+    print(f"{len(records)} files in {time.perf_counter() - t0:.1f}s wall")
+    for r in records:
+        if not r["ok"]:
+            print(f"  FAILED  {os.path.basename(r['file'])}: {r['error'].splitlines()[0]}")
+    write_sweep_report(in_dir, out_dir, records, variants, args.time_budget, args.keep_sweep)
+    return 1 if any(not r["ok"] for r in records) else 0
+
+def driver_main(argv):
+    ap = argparse.ArgumentParser(description="Convert FBX files to GLB with N headless Blender workers.")
+    ap.add_argument("in_dir")
+    ap.add_argument("out_dir", nargs="?")
+    ap.add_argument("-j", "--jobs", type=int, default=0, help="Blender workers (0 = one per core)")
+    ap.add_argument("--blender", default=BLENDER, help="Blender executable (env BLENDER)")
+    ap.add_argument("--force", action="store_true", help="convert everything, ignoring the manifest")
+    ap.add_argument("--split-rig", action="store_true",
+                    help="one base GLB per shared armature+mesh, animation-only GLBs per clip, "
+                         f"and {ANIMATION_INDEX_NAME}")
+    add_sweep_args(ap)
+    ap.add_argument("--time-budget", type=float, default=None,
+                    help="sweep: pick the smallest variant per file exporting within this many seconds")
+    ap.add_argument("--keep-sweep", action="store_true", help="sweep: keep every variant's GLB, not just the pick")
+    args = ap.parse_args(argv)
+
+    global SPLIT_RIG
+    SPLIT_RIG = SPLIT_RIG or args.split_rig
+    extra = ["--split-rig"] if SPLIT_RIG else []
+    if SPLIT_RIG and args.force:
+        extra.append("--force")  # workers then rebuild the shared bases too
+    in_dir = os.path.abspath(args.in_dir)
+    out_dir = os.path.abspath(args.out_dir) if args.out_dir else in_dir
+    ensure_dir(out_dir)
+    if args.sweep:
+        return driver_sweep(args, in_dir, out_dir)
+    all_files = find_fbx_files(in_dir)
+    manifest = load_manifest(out_dir)
+    fbx_files, sources, stale = plan_conversions(in_dir, out_dir, all_files, manifest, args.force)
+    prune_outputs(out_dir, manifest, stale)
+    print(f"Found {len(all_files)} FBX files in {in_dir}; {len(all_files) - len(fbx_files)} up to date, "
+          f"{len(stale)} pruned.")
+    if not fbx_files:
+        save_manifest(out_dir, manifest)
+        if SPLIT_RIG:
+            write_animation_index(out_dir, manifest)
+        print("Nothing to convert.")
+        return 0
+
+    workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(fbx_files))
+    shards = plan_shards(fbx_files, workers)
+    print(f"Converting {len(fbx_files)} FBX files with {len(shards)} Blender worker(s).")
+
+    t0 = time.perf_counter()
+    suffix = ".anim.glb" if SPLIT_RIG else ".glb"
+    records = run_shards(args.blender, in_dir, out_dir, shards,
+                         lambda fbx: glb_path_for(fbx, in_dir, out_dir, suffix), extra)
+    record_results(in_dir, out_dir, manifest, records, sources)
+    save_manifest(out_dir, manifest)
+    if SPLIT_RIG:
+        write_animation_index(out_dir, manifest)
+    summary = summarize(records, time.perf_counter() - t0, len(shards), out_dir)
+    return 1 if summary["failed"] else 0
+
+def main():
+    if bpy is None:
+        sys.exit(driver_main(sys.argv[1:]))
+
+    # Parse args after --
+    argv = sys.argv
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    else:
+        argv = []
+
+    if not argv:
+        print("Usage: blender -b -P batch_fbx_to_gltf.py -- INPUT_DIR [OUTPUT_DIR]")
+        sys.exit(1)
+    blender_main(argv)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,234 @@
+"""
+Checks batch_fbx_to_gltf.py --split-rig output the way a loader that binds
+animation tracks by node name (three.js PropertyBinding and the like) would
+use it: base GLB scene + clip animation retargeted by node name.
+
+For every clip in animation_index.json:
+  - the base has a skin and no animation, the clip has animation and no mesh/skin
+  - every clip channel targets a node name that exists in the base
+  - the animation actually moves the base's joints
+  - with --reference DIR (a plain export of the same FBX files, without
+    --split-rig): the base has the same skin (joints + inverse bind matrices)
+    and base + clip give the same joint world matrices at every key time as
+    the single-file GLB
+
+Usage:
+  python check_split_rig_glb.py OUTPUT_DIR [--reference PLAIN_OUTPUT_DIR]
+
+Sample input (needs Blender): --make-example writes wave.fbx and nod.fbx (one
+rigged, skinned cylinder, two clips) and crate.fbx (a static prop), so the
+whole path can be checked without committing generated GLBs:
+  blender -b -P check_split_rig_glb.py -- --make-example FBX_DIR
+  python batch_fbx_to_gltf.py FBX_DIR SPLIT_DIR --split-rig
+  python batch_fbx_to_gltf.py FBX_DIR PLAIN_DIR
+  python check_split_rig_glb.py SPLIT_DIR --reference PLAIN_DIR
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+
+import numpy as np
+
+COMPONENT_TYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT4": 16}
+
+class Glb:
+    """The JSON chunk, BIN chunk and accessor reads of one .glb file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        json_len = struct.unpack_from("<I", data, 12)[0]
+        self.doc = json.loads(data[20:20 + json_len])
+        self.bin = data[20 + json_len + 8:]
+        self.names = [n.get("name") for n in self.doc.get("nodes", [])]
+        self.parent = {c: i for i, n in enumerate(self.doc.get("nodes", [])) for c in n.get("children", [])}
+
+    def accessor(self, i):
+        acc = self.doc["accessors"][i]
+        view = self.doc["bufferViews"][acc["bufferView"]]
+        width = TYPE_SIZES[acc["type"]]
+        arr = np.frombuffer(self.bin, COMPONENT_TYPES[acc["componentType"]], acc["count"] * width,
+                            view.get("byteOffset", 0) + acc.get("byteOffset", 0))
+        return arr.reshape(acc["count"], width).astype(np.float64)
+
+    def channels(self):
+        """(node name, path) -> (times, values) over all animations."""
+        out = {}
+        for anim in self.doc.get("animations", []):
+            for ch in anim["channels"]:
+                sampler = anim["samplers"][ch["sampler"]]
+                if sampler.get("interpolation", "LINEAR") == "CUBICSPLINE":
+                    raise ValueError("CUBICSPLINE samplers are not supported by this check")
+                out[(self.names[ch["target"]["node"]], ch["target"]["path"])] = (
+                    self.accessor(sampler["input"])[:, 0], self.accessor(sampler["output"]),
+                    sampler.get("interpolation", "LINEAR"))
+        return out
+
+def _sample(times, values, interpolation, t):
+    k = int(np.searchsorted(times, t, side="right"))
+    if k == 0:
+        return values[0]
+    if k >= len(times) or interpolation == "STEP":
+        return values[k - 1]
+    u = (t - times[k - 1]) / (times[k] - times[k - 1])
+    v = values[k - 1] * (1 - u) + values[k] * u
+    return v / np.linalg.norm(v) if len(v) == 4 else v  # nlerp for rotations
+
+def _trs_matrix(t, r, s):
+    x, y, z, w = r
+    m = np.eye(4)
+    m[:3, :3] = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ]) * np.asarray(s)
+    m[:3, 3] = t
+    return m
+
+def world_matrices(glb, channels, t):
+    """Node name -> world matrix of glb's node tree with `channels` (keyed by node name) applied at time t."""
+    local = []
+    for node in glb.doc["nodes"]:
+        trs = {
+            "translation": np.array(node.get("translation", [0, 0, 0]), float),
+            "rotation": np.array(node.get("rotation", [0, 0, 0, 1]), float),
+            "scale": np.array(node.get("scale", [1, 1, 1]), float),
+        }
+        for path in trs:
+            ch = channels.get((node.get("name"), path))
+            if ch is not None:
+                trs[path] = _sample(*ch, t)
+        local.append(_trs_matrix(trs["translation"], trs["rotation"], trs["scale"]))
+    world = {}
+    def resolve(i):
+        if i not in world:
+            world[i] = resolve(glb.parent[i]) @ local[i] if i in glb.parent else local[i]
+        return world[i]
+    return {glb.names[i]: resolve(i) for i in range(len(local))}
+
+def check_clip(out_dir, clip, reference_dir=None, tol=1e-4):
+    """Returns a list of problems (empty = OK) and a one-line description."""
+    base = Glb(os.path.join(out_dir, clip["base"]))
+    anim = Glb(os.path.join(out_dir, clip["file"]))
+    problems = []
+    if not base.doc.get("skins"):
+        problems.append("base has no skin")
+    if base.doc.get("animations"):
+        problems.append("base carries animation")
+    if anim.doc.get("meshes") or anim.doc.get("skins"):
+        problems.append("clip carries mesh/skin data")
+    channels = anim.channels()
+    if not channels:
+        problems.append("clip has no animation channels")
+    unbound = sorted({name for name, _ in channels if name not in base.names})
+    if unbound:
+        problems.append(f"channels target nodes missing from the base: {', '.join(unbound)}")
+    if problems:
+        return problems, ""
+
+    joints = [base.names[j] for skin in base.doc["skins"] for j in skin["joints"]]
+    times = np.unique(np.concatenate([t for t, _, _ in channels.values()]))
+    first, middle = world_matrices(base, channels, times[0]), world_matrices(base, channels, times[len(times) // 2])
+    motion = max(np.abs(first[n] - middle[n]).max() for n in joints)
+    if motion == 0:
+        problems.append("animation does not move any joint of the base")
+    detail = f"{len(channels)} channels, {len(times)} key times, motion {motion:.3f}"
+
+    if reference_dir:
+        ref = Glb(os.path.join(reference_dir, os.path.splitext(clip["source"])[0] + ".glb"))
+        ref_skin, base_skin = ref.doc["skins"][0], base.doc["skins"][0]
+        if ([ref.names[j] for j in ref_skin["joints"]] != [base.names[j] for j in base_skin["joints"]]
+                or not np.allclose(ref.accessor(ref_skin["inverseBindMatrices"]),
+                                   base.accessor(base_skin["inverseBindMatrices"]), atol=1e-5)):
+            problems.append("base skin differs from the plain export")
+        ref_channels = ref.channels()
+        ref_times = np.unique(np.concatenate([t for t, _, _ in ref_channels.values()]))
+        err = 0.0
+        for t in ref_times:
+            got, want = world_matrices(base, channels, t), world_matrices(ref, ref_channels, t)
+            err = max(err, max(np.abs(got[n] - want[n]).max() for n in joints))
+        if err > tol:
+            problems.append(f"joint matrices differ from the plain export by up to {err:.2e}")
+        detail += f", max joint-matrix diff vs plain export {err:.1e}"
+    return problems, detail
+
+def make_example(fbx_dir):
+    """Write the sample FBX files (see the module docstring); must run inside Blender."""
+    import math
+    import bpy
+
+    os.makedirs(fbx_dir, exist_ok=True)
+    for clip, axis in (("wave", 0), ("nod", 1)):
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+        bpy.ops.mesh.primitive_cylinder_add(vertices=12, depth=2, location=(0, 0, 1))
+        mesh = bpy.context.object
+        mesh.name = "Body"
+        bpy.ops.object.mode_set(mode='EDIT')
+        bpy.ops.mesh.subdivide(number_cuts=4)
+        bpy.ops.object.mode_set(mode='OBJECT')
+        mesh.data.materials.append(bpy.data.materials.new("Skin"))
+        bpy.ops.object.armature_add(location=(0, 0, 0))
+        arm = bpy.context.object
+        arm.name = "Rig"
+        bpy.ops.object.mode_set(mode='EDIT')
+        root = arm.data.edit_bones[0]
+        root.name, root.head, root.tail = "Root", (0, 0, 0), (0, 0, 1)
+        upper = arm.data.edit_bones.new("Upper")
+        upper.head, upper.tail, upper.parent = (0, 0, 1), (0, 0, 2), root
+        bpy.ops.object.mode_set(mode='OBJECT')
+        # blend Root -> Upper over the middle of the cylinder
+        root_group, upper_group = mesh.vertex_groups.new(name="Root"), mesh.vertex_groups.new(name="Upper")
+        for v in mesh.data.vertices:
+            w = max(0.0, min(1.0, v.co.z - 0.5))
+            upper_group.add([v.index], w, 'REPLACE')
+            root_group.add([v.index], 1.0 - w, 'REPLACE')
+        mesh.parent = arm
+        mesh.modifiers.new("Armature", 'ARMATURE').object = arm
+        arm.animation_data_create()
+        arm.animation_data.action = bpy.data.actions.new(clip)
+        bone = arm.pose.bones["Upper"]
+        bone.rotation_mode = 'XYZ'
+        for frame, angle in ((1, 0), (20, 45), (40, 0)):
+            bone.rotation_euler = [math.radians(angle) if i == axis else 0 for i in range(3)]
+            bone.keyframe_insert("rotation_euler", frame=frame)
+        bpy.context.scene.frame_start, bpy.context.scene.frame_end = 1, 40
+        bpy.ops.export_scene.fbx(filepath=os.path.join(fbx_dir, f"{clip}.fbx"), bake_anim=True, add_leaf_bones=False)
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    bpy.ops.mesh.primitive_cube_add()
+    bpy.ops.export_scene.fbx(filepath=os.path.join(fbx_dir, "crate.fbx"))
+    print(f"[OK] Example FBX files: {fbx_dir}")
+
+def main(argv=None):
+    if argv is None and "--" in sys.argv:
+        argv = sys.argv[sys.argv.index("--") + 1:]  # run by Blender
+    ap = argparse.ArgumentParser(description="Check --split-rig base/clip GLBs bind by node name.")
+    ap.add_argument("out_dir", nargs="?", help="batch_fbx_to_gltf.py --split-rig OUTPUT_DIR (with animation_index.json)")
+    ap.add_argument("--reference", default=None, help="plain (non-split) export of the same FBX files to compare against")
+    ap.add_argument("--make-example", metavar="FBX_DIR", default=None,
+                    help="write sample FBX input for the check instead (inside Blender)")
+    args = ap.parse_args(argv)
+    if args.make_example:
+        make_example(args.make_example)
+        return 0
+    if not args.out_dir:
+        ap.error("OUTPUT_DIR is required")
+
+    with open(os.path.join(args.out_dir, "animation_index.json"), encoding="utf-8") as f:
+        index = json.load(f)
+    failed = 0
+    for clip in index["clips"]:
+        problems, detail = check_clip(args.out_dir, clip, args.reference)
+        if problems:
+            failed += 1
+            print(f"[FAIL] {clip['file']} on {clip['base']}: " + "; ".join(problems))
+        else:
+            print(f"[OK] {clip['file']} on {clip['base']}: {detail}")
+    print(f"{len(index['clips']) - failed} clip(s) OK, {failed} failed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Benchmark runner for shealth_steps_pipeline.py.
+
+For each scale it writes a synthetic export (shealth_synth_export.py), runs the
+pipeline in a fresh interpreter per configuration with --metrics, and appends
+one JSON line per run to the results file. Each run is compared with the
+previous result for the same scale/config, so throughput regressions show up
+as a positive delta.
+
+Usage:
+  python shealth_bench.py [--scales 90,730,3650,10950] [--exports 3]
+         [--configs serial,cached,parallel,numpy] [--results shealth_bench_results.jsonl]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import shealth_steps_pipeline as pipeline
+import shealth_synth_export as synth
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PIPELINE = os.path.join(HERE, "shealth_steps_pipeline.py")
+
+# name -> (extra pipeline args, reuse the previous run's parse cache)
+CONFIGS = {
+    "serial": ([], False),
+    "cached": ([], True),
+    "parallel": (["--workers", "0"], False),
+    "numpy": (["--engine", "numpy"], False),
+    "zip": (["--source", "zip"], False),
+}
+
+def run_pipeline(raw_root, zip_dir, out_dir, cache_path, extra):
+    """Run the pipeline once in a subprocess; returns (metrics doc, process wall seconds)."""
+    metrics_path = os.path.join(out_dir, "metrics.json")
+    env = dict(os.environ)
+    env.update({
+        "SHEALTH_RAW_DATA": raw_root,
+        "SHEALTH_ZIP_DIR": zip_dir,
+        "SHEALTH_OUTPUT_DIR": out_dir,
+        "SHEALTH_PARSE_CACHE": cache_path,
+    })
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, PIPELINE, *extra, "--metrics", metrics_path],
+        env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"pipeline failed ({proc.returncode}):\n{proc.stderr[-2000:]}")
+    with open(metrics_path, encoding="utf-8") as f:
+        return json.load(f), wall
+
+def load_previous(results_path):
+    """(scale_days, exports, config) -> last recorded result."""
+    prev = {}
+    try:
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    r = json.loads(line)
+                    prev[(r["scale_days"], r["exports"], r["config"])] = r
+    except FileNotFoundError:
+        pass
+    return prev
+
+def bench_scale(days, exports, configs, seed, work_dir):
+    """Generate one scale and run every config on it; returns result dicts."""
+    raw_root = os.path.join(work_dir, "RAW_DATA")
+    zip_dir = os.path.join(work_dir, "ZIP_FILES")
+    cal_start, cal_end = pipeline.calendar_range(pipeline.CLUSTERS)
+    # centre the range on the cluster calendar, extending it for long scales
+    span = (cal_end - cal_start).days + 1
+    start = (cal_start - timedelta(days=max(30, (days - span) // 2))).date()
+    files = synth.generate(raw_root, start, days, exports, seed=seed,
+                           zip_dir=zip_dir if "zip" in configs else None)
+
+    results = []
+    reference_csv = None
+    cache_path = os.path.join(work_dir, "parse_cache.json")
+    for name in configs:
+        extra, warm = CONFIGS[name]
+        if extra[:2] == ["--engine", "numpy"] and pipeline.np is None:
+            print(f"  [SKIP] {name}: numpy not installed")
+            continue
+        out_dir = os.path.join(work_dir, f"out_{name}")
+        os.makedirs(out_dir, exist_ok=True)
+        if warm:
+            # prime the cache, then measure the warm run
+            run_pipeline(raw_root, zip_dir, out_dir, cache_path, extra)
+        elif os.path.exists(cache_path):
+            os.remove(cache_path)
+        doc, wall = run_pipeline(raw_root, zip_dir, out_dir, cache_path, extra)
+
+        with open(doc["csv"], "rb") as f:
+            csv_bytes = f.read()
+        if reference_csv is None:
+            reference_csv = csv_bytes
+        stages = {}
+        for st in doc["stages"]:
+            stages[st["stage"]] = round(stages.get(st["stage"], 0.0) + st["wall_s"], 6)
+        parse = next((st for st in doc["stages"] if st["stage"] == "parsing"), {})
+        results.append({
+            "utc": datetime.now(timezone.utc).isoformat(),
+            "scale_days": days,
+            "exports": exports,
+            "files": files,
+            "config": name,
+            "process_wall_s": round(wall, 4),
+            "pipeline_wall_s": doc["total_wall_s"],
+            "parse_records_per_s": parse.get("records_per_s"),
+            "process_peak_rss_bytes": doc.get("process_peak_rss_bytes"),
+            "children_peak_rss_bytes": doc.get("children_peak_rss_bytes"),
+            "stages": stages,
+            "csv_matches_first_config": csv_bytes == reference_csv,
+        })
+    return results
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark shealth_steps_pipeline.py on synthetic exports.")
+    ap.add_argument("--scales", default="90,730,3650,10950",
+                    help="comma-separated day counts to generate (default: 3 months .. 30 years)")
+    ap.add_argument("--exports", type=int, default=3, help="exports per scale (cumulative, like real uploads)")
+    ap.add_argument("--configs", default="serial,cached,parallel,numpy",
+                    help=f"comma-separated subset of: {', '.join(CONFIGS)}")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--results", default="shealth_bench_results.jsonl",
+                    help="JSON-lines file the results are appended to")
+    ap.add_argument("--keep", action="store_true", help="keep the generated trees (printed paths)")
+    args = ap.parse_args(argv)
+
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = [c for c in configs if c not in CONFIGS]
+    if unknown:
+        ap.error(f"unknown config(s): {', '.join(unknown)}")
+    previous = load_previous(args.results)
+
+    print(f"{'days':>6} {'files':>7} {'config':<9} {'wall_s':>8} {'parse_s':>8} {'rec/s':>9} {'vs_prev':>8}")
+    for days in (int(x) for x in args.scales.split(",") if x.strip()):
+        work_dir = tempfile.mkdtemp(prefix=f"shealth_bench_{days}_")
+        try:
+            results = bench_scale(days, args.exports, configs, args.seed, work_dir)
+        finally:
+            if args.keep:
+                print(f"  [KEEP] {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        with open(args.results, "a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+                prev = previous.get((r["scale_days"], r["exports"], r["config"]))
+                delta = ""
+                if prev and prev["pipeline_wall_s"]:
+                    delta = f"{(r['pipeline_wall_s'] / prev['pipeline_wall_s'] - 1) * 100:+.0f}%"
+                flag = "" if r["csv_matches_first_config"] else "  CSV MISMATCH"
+                print(f"{days:>6} {r['files']:>7} {r['config']:<9} {r['pipeline_wall_s']:>8.3f} "
+                      f"{r['stages'].get('parsing', 0):>8.3f} {r['parse_records_per_s'] or 0:>9.0f} {delta:>8}{flag}")
+    print(f"[OK] Results appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
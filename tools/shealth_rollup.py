@@ -0,0 +1,116 @@
+"""
+Multi-resolution rollups of a daily steps timeline (date, steps, distance_km):
+weekly / monthly / yearly sums and trailing 7- and 30-day means, computed in
+one pass over the date-sorted rows and written as one compact, pre-sorted JSON
+file the API can serve as-is.
+
+Used by shealth_steps_pipeline.py (--rollup) and 2_plotDataFromShealthJson.py.
+
+Usage:
+  python shealth_rollup.py steps_summary_pedometer.csv [--out steps_summary_pedometer.rollup.json]
+"""
+
+import os
+import csv
+import json
+import argparse
+from collections import deque
+from datetime import date, timedelta
+
+ROLLUP_VERSION = 1
+ROLLING_WINDOWS = (7, 30)
+
+def _period_starts(d):
+    """(week start = Monday, month start, year start) for a date."""
+    return d - timedelta(days=d.weekday()), d.replace(day=1), d.replace(month=1, day=1)
+
+def compute_rollups(rows):
+    """
+    rows: iterable of (date 'YYYY-MM-DD' or date, steps, distance_km), any order.
+    Returns the rollup document. Rolling means are trailing calendar-day windows
+    over the days present in the data (like pandas rolling('7D')), aligned with
+    the daily arrays.
+    """
+    days = []
+    for d, steps, km in rows:
+        if not isinstance(d, date):
+            d = date.fromisoformat(str(d)[:10])
+        days.append((d, int(steps or 0), float(km or 0.0)))
+    days.sort(key=lambda r: r[0])
+
+    daily = {"date": [], "steps": [], "distance_km": []}
+    periods = {name: {"start": [], "days": [], "steps": [], "distance_km": []}
+               for name in ("week", "month", "year")}
+    rolling = {f"{col}_{w}d": [] for w in ROLLING_WINDOWS for col in ("steps", "distance_km")}
+    windows = {w: (deque(), [0, 0.0]) for w in ROLLING_WINDOWS}
+
+    for d, steps, km in days:
+        ds = d.isoformat()
+        daily["date"].append(ds)
+        daily["steps"].append(steps)
+        daily["distance_km"].append(km)
+
+        # period sums: rows are sorted, so a new start closes the previous bucket
+        for name, start in zip(("week", "month", "year"), _period_starts(d)):
+            p = periods[name]
+            key = start.isoformat()
+            if not p["start"] or p["start"][-1] != key:
+                p["start"].append(key)
+                p["days"].append(0)
+                p["steps"].append(0)
+                p["distance_km"].append(0.0)
+            p["days"][-1] += 1
+            p["steps"][-1] += steps
+            p["distance_km"][-1] += km
+
+        # trailing windows: running sums, drop days that fell out of the window
+        for w, (win, sums) in windows.items():
+            win.append((d, steps, km))
+            sums[0] += steps
+            sums[1] += km
+            cutoff = d - timedelta(days=w - 1)
+            while win[0][0] < cutoff:
+                _, s0, k0 = win.popleft()
+                sums[0] -= s0
+                sums[1] -= k0
+            rolling[f"steps_{w}d"].append(round(sums[0] / len(win), 1))
+            rolling[f"distance_km_{w}d"].append(round(sums[1] / len(win), 3))
+
+    for p in periods.values():
+        p["distance_km"] = [round(v, 3) for v in p["distance_km"]]
+    daily.update(rolling)
+    return {
+        "version": ROLLUP_VERSION,
+        "first": daily["date"][0] if days else None,
+        "last": daily["date"][-1] if days else None,
+        "daily": daily,
+        **periods,
+    }
+
+def read_steps_csv(path):
+    """(date, steps, distance_km) rows from a date,steps,distance_km CSV."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(r["date"], int(float(r["steps"] or 0)), float(r["distance_km"] or 0))
+                for r in csv.DictReader(f)]
+
+def rollup_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".rollup.json"
+
+def write_rollups(doc, path):
+    """Write compactly (no whitespace), replacing the previous file atomically."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Write weekly/monthly/yearly + rolling rollups for a steps CSV.")
+    ap.add_argument("csv")
+    ap.add_argument("--out", default=None, help="output JSON (default: <csv>.rollup.json)")
+    args = ap.parse_args(argv)
+    out = write_rollups(compute_rollups(read_steps_csv(args.csv)), args.out or rollup_path_for(args.csv))
+    print(f"[OK] Wrote: {out}")
+
+if __name__ == "__main__":
+    main()
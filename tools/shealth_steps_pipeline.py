@@ -1,9 +1,33 @@
 ﻿import os
 import json
+import re
 import csv
-from glob import glob
+import io
+import time
+import zipfile
+import sys
+import argparse
+import tracemalloc
+import select
+import struct
+import socketserver
+from bisect import bisect_left
+from functools import lru_cache
+from contextlib import contextmanager, redirect_stdout
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+try:
+    import numpy as np  # optional: only needed for --engine numpy
+except ImportError:
+    np = None
+
+try:
+    import orjson  # optional: faster JSON decoding when installed
+except ImportError:
+    orjson = None
+
 # -------------------- CONFIG --------------------
 
 # Personalized steps→km fit (based on Samsung Health samples).
@@ -31,6 +55,66 @@ OUTPUT_DIR = os.environ.get(
     RAW_DATA_ROOT  # default: write CSV next to RAW_DATA
 )
 
+# Uploaded archives; with SHEALTH_SOURCE=zip the pipeline reads binning files
+# straight out of these instead of the extracted RAW_DATA trees.
+ZIP_DIR = os.environ.get(
+    "SHEALTH_ZIP_DIR",
+    os.path.join(os.path.dirname(os.path.normpath(RAW_DATA_ROOT)), "ZIP_FILES")
+)
+SOURCE = os.environ.get("SHEALTH_SOURCE", "raw")  # raw | zip
+
+# Timeline engine: "python" (per-day dicts) or "numpy" (columnar, same CSV)
+ENGINE = os.environ.get("SHEALTH_ENGINE", "python")
+
+# JSON decoder for binning files: auto (orjson if installed) | json | orjson.
+# Env-only so process-pool workers pick it up too.
+JSON_DECODER = os.environ.get("SHEALTH_JSON_DECODER", "auto")
+
+# Detect the bin schema once per folder and use a specialized extractor for it
+# (set SHEALTH_SPECIALIZE=0 to always use the generic key-probing path)
+SPECIALIZE_SCHEMAS = os.environ.get("SHEALTH_SPECIALIZE", "1") != "0"
+
+# Files larger than this (bytes) are parsed incrementally with bounded memory
+# instead of being decoded whole; 0 disables streaming.
+STREAM_THRESHOLD = int(os.environ.get("SHEALTH_STREAM_THRESHOLD", str(32 * 1024 * 1024)) or 0)
+STREAM_CHUNK = 64 * 1024
+
+# Machine-readable stage metrics: a JSON file path, or "-" for stdout
+METRICS_PATH = os.environ.get("SHEALTH_METRICS", "")
+# Optional profiler: "cprofile" or "tracemalloc"
+PROFILE = os.environ.get("SHEALTH_PROFILE", "")
+
+# Delta output: also write only the dates that changed since the last emitted
+# timeline. SHEALTH_DELTA_KEY keeps separate snapshots per consumer (e.g. user id).
+DELTA = os.environ.get("SHEALTH_DELTA", "0") == "1"
+DELTA_KEY = os.environ.get("SHEALTH_DELTA_KEY", "")
+
+# Also write <csv>.rollup.json (weekly/monthly/yearly sums, 7/30-day means; see shealth_rollup.py)
+ROLLUP = os.environ.get("SHEALTH_ROLLUP", "0") == "1"
+
+# Bulk import output for FitnessDaily: "sql" = batched multi-row upserts,
+# "load-data" = TSV + LOAD DATA LOCAL INFILE script, "" = CSV only.
+# SHEALTH_SQL_USER is the FitnessDaily.UserId the rows are written for.
+SQL_MODE = os.environ.get("SHEALTH_SQL", "").lower()
+SQL_USER = os.environ.get("SHEALTH_SQL_USER", "")
+SQL_BATCH = int(os.environ.get("SHEALTH_SQL_BATCH", "500") or 500)
+SQL_DIALECT = os.environ.get("SHEALTH_SQL_DIALECT", "mysql").lower()
+
+# Watch mode: quiet period (s) after the last filesystem event before re-running,
+# and the scan interval (s) when inotify is unavailable.
+WATCH_DEBOUNCE = float(os.environ.get("SHEALTH_WATCH_DEBOUNCE", "3") or 3)
+WATCH_POLL_INTERVAL = float(os.environ.get("SHEALTH_WATCH_POLL", "10") or 10)
+
+# Parallel parsing: 1 = serial (default), 0 = one worker per CPU core
+PARSE_WORKERS = int(os.environ.get("SHEALTH_PARSE_WORKERS", "1") or 1)
+
+# Persistent parse manifest (path + size + mtime -> parsed result).
+# Set SHEALTH_PARSE_CACHE to "off" (or empty) to disable it.
+PARSE_CACHE_PATH = os.environ.get(
+    "SHEALTH_PARSE_CACHE",
+    os.path.join(OUTPUT_DIR, ".steps_parse_cache.json")
+)
+
 # Three rock-solid clusters (triplets) — ISO format dates
 CLUSTERS = [
     {"start_date": "2021-12-14", "steps_seq": [4702, 6105, 10453]},  # 2021-12-14..16
@@ -38,12 +122,20 @@ CLUSTERS = [
     {"start_date": "2025-09-15", "steps_seq": [4964, 1247, 2865]},   # 2025-09-15..17
 ]
 
-# Calendar strictly spans the cluster range (inclusive)
-CAL_START = datetime.strptime(min(c["start_date"] for c in CLUSTERS), "%Y-%m-%d")
-CAL_END = max(
-    datetime.strptime(c["start_date"], "%Y-%m-%d") + timedelta(days=2)
-    for c in CLUSTERS
-)
+# Optional JSON file with anchor clusters, replacing the built-in CLUSTERS:
+#   [{"start_date": "YYYY-MM-DD", "steps_seq": [..]}, ...]   (or {"clusters": [...]})
+CLUSTERS_PATH = os.environ.get("SHEALTH_CLUSTERS", "")
+
+def calendar_range(clusters):
+    """Calendar strictly spans the cluster range (inclusive of each cluster's last day)."""
+    start = min(datetime.strptime(c["start_date"], "%Y-%m-%d") for c in clusters)
+    end = max(
+        datetime.strptime(c["start_date"], "%Y-%m-%d") + timedelta(days=len(c["steps_seq"]) - 1)
+        for c in clusters
+    )
+    return start, end
+
+CAL_START, CAL_END = calendar_range(CLUSTERS)
 
 # -------------------- HELPERS --------------------
 
@@ -71,6 +163,25 @@ def try_parse_date_like(x):
         return None
     return None
 
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+_MAX_EPOCH_DAYS = datetime(9999, 12, 31).toordinal() - _EPOCH_ORDINAL
+
+@lru_cache(maxsize=None)
+def _epoch_day_to_str(days):
+    return datetime.fromordinal(_EPOCH_ORDINAL + days).strftime('%Y-%m-%d')
+
+def fast_date_like(x):
+    """
+    try_parse_date_like with a fast path for plain int epochs (ms or s): the UTC
+    day is integer division, and day strings are memoized. Anything else (floats,
+    strings, out-of-range values) goes through try_parse_date_like.
+    """
+    if type(x) is int:
+        days = x // 86_400_000 if x > 10_000_000_000 else x // 86_400
+        if 0 <= days <= _MAX_EPOCH_DAYS:
+            return _epoch_day_to_str(days)
+    return try_parse_date_like(x)
+
 def extract_date_from_entry(entry):
     for k in ("mBestStepsDate", "mStartTime", "start_time", "day_time", "time", "date", "day_start"):
         if k in entry:
@@ -79,24 +190,128 @@ def extract_date_from_entry(entry):
                 return ds
     return None
 
+PEDOMETER_DIR_NAME = "com.samsung.shealth.tracker.pedometer_day_summary"
+BINNING_SUFFIX = ".binning_data.json"
+
+# The only stat fields the pipeline uses. A full os.stat_result costs ~600 bytes
+# per file; this also serves as the stat-like view of ZIP members.
+FileStat = namedtuple("FileStat", "st_size st_mtime st_mtime_ns")
+
+def _iter_subdirs(path):
+    """Yield non-hidden subdirectory DirEntries of path (unreadable dirs are skipped)."""
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return
+    with it:
+        for e in it:
+            if e.name.startswith("."):
+                continue
+            try:
+                if e.is_dir():
+                    yield e
+            except OSError:
+                continue
+
 def find_all_pedometer_dirs(raw_root):
-    """Find every .../jsons/com.samsung.shealth.tracker.pedometer_day_summary directory under RAW_DATA."""
-    pattern = os.path.join(
-        raw_root,
-        "**",
-        "jsons",
-        "com.samsung.shealth.tracker.pedometer_day_summary"
-    )
-    dirs = [d for d in glob(pattern, recursive=True) if os.path.isdir(d)]
+    """
+    Find every .../jsons/com.samsung.shealth.tracker.pedometer_day_summary directory under RAW_DATA
+    with a single scandir walk. Other com.samsung.* folders (other trackers) are pruned.
+    """
+    dirs = []
+    stack = [(raw_root, None)]
+    while stack:
+        path, name = stack.pop()
+        for e in _iter_subdirs(path):
+            if e.name == PEDOMETER_DIR_NAME and name == "jsons":
+                dirs.append(e.path)
+            elif not e.name.startswith("com.samsung."):
+                stack.append((e.path, e.name))
     dirs.sort()
     return dirs
 
 def find_all_binning_files_in_dir(pedo_dir):
-    """Return ALL *.binning_data.json found recursively under pedo_dir (covers 0..f)."""
-    pattern = os.path.join(pedo_dir, "**", "*.binning_data.json")
-    files = glob(pattern, recursive=True)
-    files.sort(key=lambda p: (os.path.getmtime(p), p))  # stable ordering
-    return files
+    """
+    Return [(path, stat)] for ALL *.binning_data.json found recursively under pedo_dir (covers 0..f).
+    Each entry is stat'ed exactly once; the stat is reused for ordering, caching and records.
+    """
+    found = []
+    stack = [pedo_dir]
+    while stack:
+        path = stack.pop()
+        try:
+            it = os.scandir(path)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.name.startswith("."):
+                    continue
+                try:
+                    if e.is_dir():
+                        stack.append(e.path)
+                    elif e.name.endswith(BINNING_SUFFIX) and e.is_file():
+                        st = e.stat()
+                        found.append((e.path, FileStat(st.st_size, st.st_mtime, st.st_mtime_ns)))
+                except OSError:
+                    continue
+    found.sort(key=lambda ps: (ps[1].st_mtime, ps[0]))  # stable ordering
+    return found
+
+def _is_pedometer_member(name):
+    """Mirror of the RAW_DATA walk for archive member names (always '/'-separated)."""
+    if not name.endswith(BINNING_SUFFIX):
+        return None
+    parts = name.split("/")
+    if any(p.startswith(".") for p in parts):
+        return None
+    for k in range(len(parts) - 2):
+        if parts[k] == "jsons" and parts[k + 1] == PEDOMETER_DIR_NAME:
+            if any(p.startswith("com.samsung.") for p in parts[:k]):
+                return None
+            return "/".join(parts[:k + 2])
+    return None
+
+def find_all_zip_binning_members(zip_dir):
+    """
+    Return [(virtual_path, zip_path, member_name, FileStat)] for every pedometer
+    binning member in every *.zip under zip_dir, read from the central directory only.
+    virtual_path = <zip_path>/<member> and plays the role of the file path, so ordering
+    follows the same (pedometer dir, mtime, path) rules as the extracted tree.
+    """
+    try:
+        zips = sorted(
+            e.path for e in os.scandir(zip_dir)
+            if e.name.lower().endswith(".zip") and e.is_file()
+        )
+    except OSError as e:
+        print(f"[WARN] cannot list {zip_dir}: {e}")
+        return []
+
+    groups = {}
+    for zp in zips:
+        try:
+            with zipfile.ZipFile(zp) as zf:
+                infos = zf.infolist()
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"[READ FAIL] {zp}: {e}")
+            continue
+        for info in infos:
+            if info.is_dir():
+                continue
+            pedo = _is_pedometer_member(info.filename)
+            if pedo is None:
+                continue
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            st = FileStat(info.file_size, mtime, int(mtime) * 1_000_000_000)
+            vpath = os.path.join(zp, *info.filename.split("/"))
+            vdir = os.path.join(zp, *pedo.split("/"))
+            groups.setdefault(vdir, []).append((vpath, zp, info.filename, st))
+
+    members = []
+    for vdir in sorted(groups):
+        members.extend(sorted(groups[vdir], key=lambda m: (m[3].st_mtime, m[0])))
+    return members
 
 # -------------------- EXTRACTION --------------------
 
@@ -144,21 +359,36 @@ def _accumulate_from_iterable(items):
         "raw_date": found_date,
     }
 
-def process_binning_json(filepath):
+def _accumulate_single_object(data):
+    """Single-object pedometer aggregate: sums every positive step/distance key."""
+    steps = 0
+    for sk in ("mBestSteps", "mStepCount", "count", "steps", "value"):
+        if sk in data and isinstance(data[sk], (int, float)) and data[sk] > 0:
+            steps += int(data[sk])
+    total_distance = 0.0
+    found_distance = False
+    for dk in ("mDistance", "distance"):
+        if dk in data and isinstance(data[dk], (int, float)) and data[dk] > 0:
+            total_distance += float(data[dk])
+            found_distance = True
+    if steps > 0 or found_distance:
+        rd = extract_date_from_entry(data)
+        distance_km = (total_distance / 1000.0) if (found_distance and total_distance > 0) else steps_to_km(steps)
+        return {
+            "steps": int(steps),
+            "distance_km": round(distance_km, 2),
+            "raw_date": rd,
+        }
+    return None
+
+def parse_binning_data(data):
     """
-    Robustly parse a ∗.binning_data.json that may be:
+    Robustly extract steps/distance from decoded binning JSON that may be:
       - list of bins
       - dict with 'binning_data' / 'items' / 'data' lists
       - single-object pedometer aggregate
-    Returns dict with steps, distance_km, raw_date, mtime; or None if empty.
+    Returns dict with steps, distance_km, raw_date; or None if empty.
     """
-    try:
-        with open(filepath, encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"[READ FAIL] {filepath}: {e}")
-        return None
-
     result = None
 
     if isinstance(data, list):
@@ -173,87 +403,804 @@ def process_binning_json(filepath):
 
         # single-object fallback
         if result is None:
-            steps = 0
-            for sk in ("mBestSteps", "mStepCount", "count", "steps", "value"):
-                if sk in data and isinstance(data[sk], (int, float)) and data[sk] > 0:
-                    steps += int(data[sk])
-            total_distance = 0.0
-            found_distance = False
-            for dk in ("mDistance", "distance"):
-                if dk in data and isinstance(data[dk], (int, float)) and data[dk] > 0:
-                    total_distance += float(data[dk])
-                    found_distance = True
-            if steps > 0 or found_distance:
-                rd = extract_date_from_entry(data)
-                distance_km = (total_distance / 1000.0) if (found_distance and total_distance > 0) else steps_to_km(steps)
-                result = {
-                    "steps": int(steps),
-                    "distance_km": round(distance_km, 2),
-                    "raw_date": rd,
-                }
-
-    if not result:
+            result = _accumulate_single_object(data)
+
+    return result or None
+
+# -------------------- SCHEMA-SPECIALIZED EXTRACTION --------------------
+
+STEP_KEYS = ("mStepCount", "mBestSteps", "count", "steps", "value")
+DISTANCE_KEYS = ("mDistance", "distance")
+DATE_KEYS = ("mBestStepsDate", "mStartTime", "start_time", "day_time", "time", "date", "day_start")
+CONTAINER_KEYS = ("binning_data", "items", "data")
+
+class BinningSchema:
+    """
+    Shape of the bins in one file family: where the bin list lives and the exact
+    key set of a bin. When a file's bins all have that key set, the candidate
+    keys that are absent never need probing, so the extractor only reads the
+    present ones (in the generic priority order).
+    """
+    __slots__ = ("container", "keyset", "step_keys", "dist_keys", "date_keys")
+
+    def __init__(self, container, sample):
+        self.container = container
+        self.keyset = frozenset(sample)
+        self.step_keys = tuple(k for k in STEP_KEYS if k in sample)
+        self.dist_keys = tuple(k for k in DISTANCE_KEYS if k in sample)
+        self.date_keys = tuple(k for k in DATE_KEYS if k in sample)
+
+    @classmethod
+    def detect(cls, data):
+        """Schema for list / container payloads with dict bins, else None."""
+        container = None
+        if isinstance(data, list):
+            items = data
+        elif isinstance(data, dict):
+            for ck in CONTAINER_KEYS:
+                if ck in data and isinstance(data[ck], list):
+                    container, items = ck, data[ck]
+                    break
+            else:
+                return None
+        else:
+            return None
+        sample = next((e for e in items if isinstance(e, dict)), None)
+        return cls(container, sample) if sample is not None else None
+
+    def items_of(self, data):
+        """The bin list if `data` has this schema's top-level shape, else None."""
+        if self.container is None:
+            return data if type(data) is list else None
+        if type(data) is not dict:
+            return None
+        for ck in CONTAINER_KEYS:
+            if ck == self.container:
+                break
+            if isinstance(data.get(ck), list):  # generic path would pick this one
+                return None
+        items = data.get(self.container)
+        return items if isinstance(items, list) else None
+
+def _accumulate_with_schema(items, schema):
+    """
+    _accumulate_from_iterable specialized for `schema`; same result. Applies when
+    every bin has exactly the schema's key set with at most one step and one
+    distance key: then the per-bin work is a plain column read. Anything else
+    (other keys, non-dict bins, non-numeric values) returns the generic result.
+    """
+    if len(schema.step_keys) > 1 or len(schema.dist_keys) > 1:
+        return _accumulate_from_iterable(items)
+    keyset = schema.keyset
+    try:
+        if not all(e.keys() == keyset for e in items):
+            return _accumulate_from_iterable(items)
+
+        # JSON values other than numbers raise TypeError on "> 0" -> generic path
+        total_steps = 0
+        if schema.step_keys:
+            sk = schema.step_keys[0]
+            total_steps = sum([int(v) for v in [e[sk] for e in items] if v > 0])
+
+        total_distance = 0.0
+        found_distance = False
+        if schema.dist_keys:
+            dk = schema.dist_keys[0]
+            dists = [float(v) for v in [e[dk] for e in items] if v > 0]
+            found_distance = bool(dists)
+            for v in dists:  # same left-to-right float sum as the generic loop
+                total_distance += v
+    except (AttributeError, TypeError):
+        return _accumulate_from_iterable(items)
+
+    if total_steps == 0 and not found_distance:
         return None
 
-    result.update({
-        "file": filepath,
-        "mtime": os.path.getmtime(filepath),
-    })
-    return result
+    found_date = None
+    if schema.date_keys:
+        for e in items:
+            for k in schema.date_keys:
+                found_date = fast_date_like(e[k])
+                if found_date:
+                    break
+            if found_date:
+                break
+
+    distance_km = (total_distance / 1000.0) if (found_distance and total_distance > 0) else steps_to_km(total_steps)
+    return {
+        "steps": int(total_steps),
+        "distance_km": round(distance_km, 2),
+        "raw_date": found_date,
+    }
+
+# family (folder) -> BinningSchema or None; per process, so each pool worker learns its own
+_SCHEMAS = {}
+
+def parse_binning_data_family(data, family):
+    """
+    parse_binning_data using the schema detected for `family` (the file's folder).
+    The first file of a family is parsed generically and its schema recorded;
+    files that don't fit, or come out empty, fall back to the generic path.
+    """
+    if not SPECIALIZE_SCHEMAS:
+        return parse_binning_data(data)
+    schema = _SCHEMAS.get(family)
+    if schema is None:
+        _SCHEMAS[family] = BinningSchema.detect(data)
+        return parse_binning_data(data)
+    items = schema.items_of(data)
+    if items is None:
+        return parse_binning_data(data)
+    # empty results fall through so the generic single-object fallback still applies
+    return _accumulate_with_schema(items, schema) or parse_binning_data(data)
 
-def discover_all_records(raw_root):
+def _use_orjson():
+    if JSON_DECODER == "orjson" and orjson is None:
+        raise RuntimeError("SHEALTH_JSON_DECODER=orjson but orjson is not installed")
+    return orjson is not None and JSON_DECODER in ("auto", "orjson")
+
+def decode_json_bytes(raw):
+    """
+    Decode a binning file's bytes. orjson is tried first when enabled; anything it
+    rejects (NaN, lone surrogates, ...) is retried with the more lenient stdlib
+    decoder so the set of accepted files doesn't change.
+    """
+    if _use_orjson():
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw.decode("utf-8"))
+
+# -------------------- STREAMING PARSE (LARGE FILES) --------------------
+
+_JSON_WS = " \t\n\r"
+_NUMBER_TAIL = set("0123456789+-.eE")
+
+class JsonStream:
+    """
+    Minimal pull parser over a text stream: arrays and objects are walked
+    element by element, everything else is decoded with JSONDecoder.raw_decode
+    on a buffer that only ever holds the unconsumed tail plus one chunk.
+    """
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of input)."""
+        while True:
+            n = len(self.buf)
+            while self.pos < n and self.buf[self.pos] in _JSON_WS:
+                self.pos += 1
+            if self.pos < n:
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # a number running into the end of the buffer may continue in the next chunk
+            if not self.eof and isinstance(obj, (int, float)):
+                i, n = end, len(self.buf)
+                while i < n and self.buf[i] in _NUMBER_TAIL:
+                    i += 1
+                if i == n and self._fill():
+                    continue
+            self.pos = end
+            return obj
+
+    def iter_array(self):
+        """Yield the elements of the array at the cursor, consuming it."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or ']' at offset {self.pos - 1}")
+
+    def iter_object_keys(self):
+        """Yield each key of the object at the cursor; the caller must consume its value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError(f"expected object key at offset {self.pos}")
+            key = self.value()
+            self.expect(":")
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == "}":
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or '}}' at offset {self.pos - 1}")
+
+    def expect_end(self):
+        if self.peek() != "":
+            raise ValueError(f"extra data at offset {self.pos}")
+
+def stream_binning_data(f):
+    """
+    parse_binning_data for a file object, without materializing the bin list.
+    Top-level lists and 'binning_data' / 'items' / 'data' arrays are accumulated
+    element by element; other arrays are skipped. Container priority, last-key-wins
+    for duplicate keys and the single-object fallback match the in-memory path.
+    """
+    stream = JsonStream(f)
+    c = stream.peek()
+    result = None
+    if c == "[":
+        result = _accumulate_from_iterable(stream.iter_array())
+    elif c == "{":
+        lists = {}    # container key -> accumulated result
+        scalars = {}  # top-level non-array values (for the single-object fallback)
+        for key in stream.iter_object_keys():
+            if stream.peek() == "[":
+                if key in CONTAINER_KEYS:
+                    lists[key] = _accumulate_from_iterable(stream.iter_array())
+                else:
+                    for _ in stream.iter_array():
+                        pass
+                scalars[key] = []  # a list never counts as a step/distance/date value
+            else:
+                lists.pop(key, None)
+                scalars[key] = stream.value()
+        for ck in CONTAINER_KEYS:
+            if ck in lists:
+                result = lists[ck]
+                break
+        if result is None:
+            result = _accumulate_single_object(scalars)
+    else:
+        stream.value()
+    stream.expect_end()
+    return result or None
+
+def _should_stream(size):
+    return STREAM_THRESHOLD > 0 and size is not None and size > STREAM_THRESHOLD
+
+def _load_and_parse(filepath, size=None):
+    """
+    Read + parse one file. Returns (ok, result): ok is False on read/decode
+    failure, result is None when the file holds no steps/distance.
+    Files above STREAM_THRESHOLD bytes are parsed incrementally.
+    Module-level so it can be shipped to ProcessPoolExecutor workers.
+    """
+    try:
+        if _should_stream(size):
+            with open(filepath, encoding="utf-8") as f:
+                return True, stream_binning_data(f)
+        with open(filepath, "rb") as f:
+            data = decode_json_bytes(f.read())
+    except Exception as e:
+        print(f"[READ FAIL] {filepath}: {e}")
+        return False, None
+    return True, parse_binning_data_family(data, os.path.dirname(filepath))
+
+def process_binning_json(filepath):
+    """
+    Parse one ∗.binning_data.json (see parse_binning_data for accepted shapes).
+    Returns a StepRecord; or None if empty.
+    """
+    ok, result = _load_and_parse(filepath, os.path.getsize(filepath))
+    if not ok or not result:
+        return None
+    return StepRecord.from_result(result, filepath, os.path.getmtime(filepath))
+
+# -------------------- RECORDS --------------------
+
+def date_to_ordinal(ds):
+    """'YYYY-MM-DD' -> proleptic ordinal; 0 for missing/unparseable/BAD_DATE."""
+    if not ds or ds == BAD_DATE:
+        return 0
+    try:
+        return datetime.strptime(ds, "%Y-%m-%d").toordinal()
+    except Exception:
+        return 0
+
+class StepRecord:
+    """
+    One parsed binning file, kept small because every file of every export is
+    held in memory at once: __slots__ instead of a dict, the date as an int
+    ordinal (0 = unknown) and the path split into an interned directory prefix
+    (shared by all files of a folder) plus the file name.
+    """
+    __slots__ = ("steps", "distance_km", "day", "mtime", "dir_id", "name")
+
+    _prefixes = []      # dir_id -> directory prefix (incl. trailing separator)
+    _prefix_ids = {}    # prefix -> dir_id
+
+    def __init__(self, steps, distance_km, day, mtime, path):
+        self.steps = steps
+        self.distance_km = distance_km
+        self.day = day
+        self.mtime = mtime
+        name = os.path.basename(path)
+        prefix = path[:len(path) - len(name)]
+        dir_id = StepRecord._prefix_ids.get(prefix)
+        if dir_id is None:
+            dir_id = len(StepRecord._prefixes)
+            StepRecord._prefixes.append(prefix)
+            StepRecord._prefix_ids[prefix] = dir_id
+        self.dir_id = dir_id
+        self.name = name
+
+    @classmethod
+    def from_result(cls, result, path, mtime):
+        return cls(result["steps"], result["distance_km"], date_to_ordinal(result["raw_date"]), mtime, path)
+
+    @property
+    def file(self):
+        return StepRecord._prefixes[self.dir_id] + self.name
+
+    @property
+    def raw_date(self):
+        return datetime.fromordinal(self.day).strftime("%Y-%m-%d") if self.day else None
+
+    def sort_key(self):
+        """Extracted date if known, else the file mtime as a naive UTC datetime; then path."""
+        if self.day:
+            dt = datetime.fromordinal(self.day)
+        else:
+            dt = datetime.utcfromtimestamp(self.mtime)  # naive
+        return (dt, self.file)
+
+# -------------------- METRICS --------------------
+
+def current_rss_bytes():
+    """Resident set size of this process right now in bytes, or None where it can't be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_bytes(children=False):
+    """
+    High-water mark of resident set size in bytes since the process started,
+    or None where it can't be read. It never goes down, so it says nothing about
+    a single stage. children=True gives the largest reaped child instead (the
+    --workers parse pool); that one is only available through 'resource'.
+    """
+    try:
+        import resource
+        who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+        peak = resource.getrusage(who).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+    except ImportError:
+        pass
+    if children:
+        return None
+    try:
+        import psutil  # Windows: no 'resource' module
+        mi = psutil.Process().memory_info()
+        return getattr(mi, "peak_wset", mi.rss)
+    except Exception:
+        return None
+
+class PipelineMetrics:
+    """
+    Wall time, counters and RSS at entry/exit per pipeline stage, emitted as
+    one JSON document. process_peak_rss_bytes is the process high-water mark
+    when the stage ended (monotonic, not the stage's own peak);
+    children_peak_rss_bytes covers the parse pool's processes. With
+    trace_alloc, tracemalloc's peak is also recorded per stage.
+    """
+
+    def __init__(self, trace_alloc=False):
+        self.trace_alloc = trace_alloc
+        self.started = time.perf_counter()
+        self.started_utc = datetime.now(timezone.utc).isoformat()
+        self.stages = []
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage; the yielded dict collects its counters (files, bytes, records, ...)."""
+        if self.trace_alloc:
+            tracemalloc.reset_peak()
+        rec = {"stage": name, "rss_start_bytes": current_rss_bytes()}
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            wall = time.perf_counter() - t0
+            rec["wall_s"] = round(wall, 6)
+            if "records" in rec and wall > 0:
+                rec["records_per_s"] = round(rec["records"] / wall, 1)
+            rec["rss_end_bytes"] = current_rss_bytes()
+            rec["process_peak_rss_bytes"] = peak_rss_bytes()
+            rec["children_peak_rss_bytes"] = peak_rss_bytes(children=True)
+            if self.trace_alloc:
+                rec["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(rec)
+
+    def stage_wall(self, name):
+        return sum(st["wall_s"] for st in self.stages if st["stage"] == name)
+
+    def to_doc(self):
+        return {
+            "started_utc": self.started_utc,
+            "total_wall_s": round(time.perf_counter() - self.started, 6),
+            "process_peak_rss_bytes": peak_rss_bytes(),
+            "children_peak_rss_bytes": peak_rss_bytes(children=True),
+            "stages": self.stages,
+            **self.counters,
+        }
+
+    def emit(self, path):
+        doc = json.dumps(self.to_doc(), indent=None if path == "-" else 2)
+        if path == "-":
+            print(doc)
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(doc)
+        print(f"[OK] Metrics: {path}")
+
+# -------------------- PARSE CACHE --------------------
+
+class ParseCache:
+    """
+    On-disk manifest of parsed binning files, keyed by path and validated by
+    (size, mtime_ns). Entries for files not seen during a run are evicted on save.
+    Read failures are never cached, so a file that is still being extracted is
+    retried next time.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @classmethod
+    def load(cls, path):
+        cache = cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                doc = json.load(f)
+            if doc.get("version") == cls.VERSION and isinstance(doc.get("files"), dict):
+                cache.entries = doc["files"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARN] ignoring unreadable parse cache {path}: {e}")
+        return cache
+
+    def begin_run(self):
+        """Reset per-run bookkeeping so a long-lived cache can serve another run."""
+        self.seen = set()
+        self.hits = self.misses = self.evicted = 0
+
+    def lookup(self, filepath, st):
+        """Return (True, result-or-None) on a hit, (False, None) on a miss."""
+        self.seen.add(filepath)
+        ent = self.entries.get(filepath)
+        if ent and ent["size"] == st.st_size and ent["mtime_ns"] == st.st_mtime_ns:
+            self.hits += 1
+            return True, ent["result"]
+        self.misses += 1
+        return False, None
+
+    def store(self, filepath, st, result):
+        self.entries[filepath] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "result": result,
+        }
+
+    def save(self):
+        stale = [k for k in self.entries if k not in self.seen]
+        for k in stale:
+            del self.entries[k]
+        self.evicted = len(stale)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "files": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+def resolve_workers(workers):
+    """0 (or negative) means one worker per CPU core."""
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+def _resolve_cache_hits(keys, stats, cache, results):
+    """
+    Fill `results` from the cache; return [(index, stat)] that still need parsing.
+    A None stat means "stat the key as a filesystem path".
+    """
+    pending = []
+    for i, key in enumerate(keys):
+        st = stats[i] if stats is not None else None
+        if st is None:
+            try:
+                st = os.stat(key)
+            except OSError as e:
+                print(f"[READ FAIL] {key}: {e}")
+                continue
+        if cache is not None:
+            hit, cached = cache.lookup(key, st)
+            if hit:
+                if cached:
+                    results[i] = StepRecord.from_result(cached, key, st.st_mtime)
+                continue
+        pending.append((i, st))
+    return pending
+
+def _store_parsed(keys, pending, parsed, cache, results):
+    for (i, st), (ok, result) in zip(pending, parsed):
+        if not ok:
+            continue
+        if cache is not None:
+            cache.store(keys[i], st, result)
+        if result:
+            results[i] = StepRecord.from_result(result, keys[i], st.st_mtime)
+
+def parse_binning_files(files, cache=None, workers=1, stats=None):
+    """
+    Parse files and return a list aligned 1:1 with `files` (None for empty or
+    unreadable files). `stats` (aligned with files) reuses stat results from
+    the directory scan; missing ones are stat'ed here. Cache hits are resolved
+    up front; the remaining files are parsed serially or in a process pool.
+    Executor.map keeps input order, so the output is identical whatever the
+    worker count.
+    """
+    results = [None] * len(files)
+    pending = _resolve_cache_hits(files, stats, cache, results)
+
+    paths = [files[i] for i, _ in pending]
+    sizes = [st.st_size for _, st in pending]
+    workers = resolve_workers(workers)
+    # results are consumed as they arrive, so parsed dicts never pile up
+    if workers > 1 and len(paths) > 1:
+        chunksize = max(1, len(paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parsed = ex.map(_load_and_parse, paths, sizes, chunksize=chunksize)
+            _store_parsed(files, pending, parsed, cache, results)
+    else:
+        _store_parsed(files, pending, map(_load_and_parse, paths, sizes), cache, results)
+    return results
+
+def _load_and_parse_zip_members(job):
+    """
+    Parse a batch of members of ONE archive: job = (zip_path, [(virtual_path, member_name, size)]).
+    Members are decoded straight from the compressed stream; nothing is written to disk.
+    Members above STREAM_THRESHOLD are parsed incrementally from the stream.
+    """
+    zip_path, members = job
+    out = []
+    try:
+        zf = zipfile.ZipFile(zip_path)
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"[READ FAIL] {zip_path}: {e}")
+        return [(False, None)] * len(members)
+    with zf:
+        for vpath, name, size in members:
+            try:
+                if _should_stream(size):
+                    with zf.open(name) as raw:
+                        out.append((True, stream_binning_data(io.TextIOWrapper(raw, encoding="utf-8"))))
+                    continue
+                data = decode_json_bytes(zf.read(name))
+            except Exception as e:
+                print(f"[READ FAIL] {vpath}: {e}")
+                out.append((False, None))
+                continue
+            out.append((True, parse_binning_data_family(data, os.path.dirname(vpath))))
+    return out
+
+def parse_zip_binning_members(members, cache=None, workers=1):
+    """
+    Same contract as parse_binning_files, for entries from find_all_zip_binning_members.
+    Work is batched per archive so each worker opens an archive once.
+    """
+    keys = [m[0] for m in members]
+    results = [None] * len(members)
+    pending = _resolve_cache_hits(keys, [m[3] for m in members], cache, results)
+
+    jobs = []
+    for i, st in pending:
+        vpath, zp, name, _ = members[i]
+        if not jobs or jobs[-1][0] != zp:
+            jobs.append((zp, []))
+        jobs[-1][1].append((vpath, name, st.st_size))
+
+    workers = resolve_workers(workers)
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            batches = ex.map(_load_and_parse_zip_members, jobs)
+            _store_parsed(keys, pending, (r for batch in batches for r in batch), cache, results)
+    else:
+        batches = map(_load_and_parse_zip_members, jobs)
+        _store_parsed(keys, pending, (r for batch in batches for r in batch), cache, results)
+    return results
+
+def discover_all_records(raw_root, cache=None, workers=1, zip_dir=None, metrics=None, dir_index=None):
     """
     Collect ALL records from ALL pedometer_day_summary folders across ALL exports.
     Ordering: primarily by extracted raw_date (if valid & not 1970), otherwise by mtime, then by path.
+    If a ParseCache is given, unchanged files are served from it instead of re-parsed.
+    workers > 1 parses in a process pool (0 = all cores); the result is the same as serial.
+    With zip_dir, exports are read from the uploaded archives instead of raw_root.
+    Stages discovery / parsing / sorting are recorded on `metrics` when given.
+    A DirIndex (worker mode) skips the pedometer-folder walk while the exports are unchanged.
     """
-    pedo_dirs = find_all_pedometer_dirs(raw_root)
-    print(f"[INFO] pedometer dirs found: {len(pedo_dirs)}")
+    if metrics is None:
+        metrics = PipelineMetrics()
+    hits0, misses0 = (cache.hits, cache.misses) if cache is not None else (0, 0)
 
-    files = []
-    for d in pedo_dirs:
-        fset = find_all_binning_files_in_dir(d)
-        files.extend(fset)
-    print(f"[INFO] binning files found: {len(files)}")
+    with metrics.stage("discovery") as st:
+        if zip_dir:
+            members = find_all_zip_binning_members(zip_dir)
+            st["files"] = len(members)
+            st["bytes"] = sum(m[3].st_size for m in members)
+        else:
+            pedo_dirs = dir_index.pedometer_dirs(raw_root) if dir_index else find_all_pedometer_dirs(raw_root)
+            files = []
+            stats = []
+            for d in pedo_dirs:
+                for fp, fst in find_all_binning_files_in_dir(d):
+                    files.append(fp)
+                    stats.append(fst)
+            st["dirs"] = len(pedo_dirs)
+            st["files"] = len(files)
+            st["bytes"] = sum(x.st_size for x in stats)
+    if zip_dir:
+        print(f"[INFO] binning members found in archives: {len(members)}")
+    else:
+        print(f"[INFO] pedometer dirs found: {len(pedo_dirs)}")
+        print(f"[INFO] binning files found: {len(files)}")
 
     # Parse all files
-    records = []
-    for fp in files:
-        rec = process_binning_json(fp)
-        if rec:
-            records.append(rec)
-
-    # ---- FIX: make the sort key always NAIVE (no tz) to avoid naive/aware comparisons
-    def rec_sort_key(r):
-        rd = r.get("raw_date")
-        dt = None
-        if rd and rd != BAD_DATE:
-            try:
-                dt = datetime.strptime(rd, "%Y-%m-%d")  # naive
-            except Exception:
-                dt = None
-        # fallback: use UTC epoch as a NAIVE datetime
-        if dt is None:
-            dt = datetime.utcfromtimestamp(r["mtime"])  # naive
-        return (dt, r["file"])
+    with metrics.stage("parsing") as st:
+        if zip_dir:
+            records = [r for r in parse_zip_binning_members(members, cache, workers) if r]
+        else:
+            records = [r for r in parse_binning_files(files, cache, workers, stats) if r]
+        st["records"] = len(records)
+        if cache is not None:
+            st["cache_hits"] = cache.hits - hits0
+            st["cache_misses"] = cache.misses - misses0
 
-    records.sort(key=rec_sort_key)
+    # sort key is always NAIVE (no tz) to avoid naive/aware comparisons
+    with metrics.stage("sorting") as st:
+        records.sort(key=StepRecord.sort_key)
+        st["records"] = len(records)
     return records
 
 # -------------------- CLUSTER → DATE MAPPING --------------------
 
-def find_sequence_index_after(records, steps_seq, start_at):
-    """Sliding-window match for steps sequence after start_at (inclusive)."""
-    L = len(steps_seq)
-    n = len(records)
-    for i in range(start_at, n - L + 1):
-        ok = True
-        for j in range(L):
-            if records[i + j]["steps"] != steps_seq[j]:
-                ok = False
-                break
-        if ok:
-            return i
-    return None
+def load_clusters(path):
+    """Load and validate anchor clusters from a JSON config file (kept in file order)."""
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    if isinstance(doc, dict):
+        doc = doc.get("clusters")
+    if not isinstance(doc, list) or not doc:
+        raise ValueError(f"{path}: expected a non-empty list of clusters")
+    clusters = []
+    for i, c in enumerate(doc):
+        seq = c.get("steps_seq") if isinstance(c, dict) else None
+        if not seq or not all(isinstance(v, int) and v > 0 for v in seq):
+            raise ValueError(f"{path}: cluster #{i} needs a non-empty positive int steps_seq")
+        datetime.strptime(c["start_date"], "%Y-%m-%d")  # raises on bad dates
+        clusters.append({"start_date": c["start_date"], "steps_seq": list(seq)})
+    return clusters
+
+class ClusterMatcher:
+    """
+    Aho-Corasick automaton over the clusters' step sequences. One pass over the
+    record steps finds every occurrence of every cluster, after which anchoring
+    only needs a bisect per cluster. Compile once, reuse for every run.
+    """
+
+    def __init__(self, clusters):
+        self.clusters = clusters
+        self.lengths = [len(c["steps_seq"]) for c in clusters]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pid, c in enumerate(clusters):
+            state = 0
+            for v in c["steps_seq"]:
+                nxt = self.goto[state].get(v)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][v] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append(pid)
+
+        queue = list(self.goto[0].values())
+        for state in queue:  # BFS; queue grows while iterating
+            for v, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and v not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(v, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+                queue.append(nxt)
+
+    def find_all(self, steps):
+        """Start positions (ascending) of every cluster in `steps`, one list per cluster."""
+        hits = [[] for _ in self.clusters]
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        state = 0
+        for i, v in enumerate(steps):
+            while state and v not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(v, 0)
+            for pid in out[state]:
+                hits[pid].append(i - lengths[pid] + 1)
+        return hits
+
+    def anchor(self, steps):
+        """
+        Sequential anchoring: each cluster (in config order) is matched at its first
+        occurrence at or after the end of the previous matched cluster; clusters with
+        no such occurrence are skipped. Returns [(cluster, start_index)].
+        """
+        hits = self.find_all(steps)
+        found = []
+        search_from = 0
+        for pid, c in enumerate(self.clusters):
+            positions = hits[pid]
+            k = bisect_left(positions, search_from)
+            if k == len(positions):
+                continue
+            idx0 = positions[k]
+            found.append((c, idx0))
+            search_from = idx0 + self.lengths[pid]
+        return found
 
 def create_blank_timeline(cal_start=CAL_START, cal_end=CAL_END):
     """Full blank, leap-safe timeline from cal_start..cal_end (inclusive)."""
@@ -264,25 +1211,23 @@ def create_blank_timeline(cal_start=CAL_START, cal_end=CAL_END):
         rows.append({"date": d.strftime("%Y-%m-%d"), "steps": 0, "distance_km": 0.0})
     return rows
 
-def assign_dates_map(records):
+def assign_dates_map(records, matcher=None):
     """
     Anchor clusters and map each record index -> date, then return a
     dict[date_str] = (steps, distance_km) using 'keep max steps per date'.
+    `matcher` is a compiled ClusterMatcher (default: built-in CLUSTERS).
     """
     if not records:
         return {}
+    if matcher is None:
+        matcher = ClusterMatcher(CLUSTERS)
 
     # locate clusters sequentially
     anchors = {}
-    search_from = 0
-    for c in CLUSTERS:
+    for c, idx0 in matcher.anchor([r.steps for r in records]):
         start_dt = datetime.strptime(c["start_date"], "%Y-%m-%d")
-        idx0 = find_sequence_index_after(records, c["steps_seq"], search_from)
-        if idx0 is None:
-            continue
         for off in range(len(c["steps_seq"])):
             anchors[idx0 + off] = start_dt + timedelta(days=off)
-        search_from = idx0 + len(c["steps_seq"])
 
     if not anchors:
         return {}
@@ -316,10 +1261,10 @@ def assign_dates_map(records):
             continue
         ds = dt.strftime("%Y-%m-%d")
         cur = by_date.get(ds)
-        if (cur is None) or (rec["steps"] > cur["steps"]) or (
-            rec["steps"] == cur["steps"] and rec["distance_km"] > cur["distance_km"]
+        if (cur is None) or (rec.steps > cur["steps"]) or (
+            rec.steps == cur["steps"] and rec.distance_km > cur["distance_km"]
         ):
-            by_date[ds] = {"steps": rec["steps"], "distance_km": rec["distance_km"]}
+            by_date[ds] = {"steps": rec.steps, "distance_km": rec.distance_km}
     return by_date
 
 def insert_data_after_timeline(timeline_rows, date_map):
@@ -359,37 +1304,1061 @@ def dedupe_across_dates_preserve_timeline(timeline_rows):
             out.append(r)
     return out
 
+# -------------------- COLUMNAR (NUMPY) ENGINE --------------------
+# Same semantics as create_blank_timeline → assign_dates_map →
+# insert_data_after_timeline → dedupe_across_dates_preserve_timeline,
+# but on datetime64[D] / int64 / float64 columns instead of per-day dicts.
+
+def records_to_columns(records):
+    n = len(records)
+    steps = np.fromiter((r.steps for r in records), dtype=np.int64, count=n)
+    dist = np.fromiter((r.distance_km for r in records), dtype=np.float64, count=n)
+    return steps, dist
+
+def assign_dates_columnar(steps, dist, matcher):
+    """
+    Vectorized assign_dates_map. Every record index takes the date of the nearest
+    anchor at or before it plus the index offset (records before the first anchor
+    count back from it). Returns (days, steps, dist) with one row per date holding
+    the max steps (tie: max distance), sorted by date; None when nothing anchors.
+    """
+    anchors = matcher.anchor(steps.tolist())
+    if not anchors:
+        return None
+
+    a_idx = np.concatenate([idx0 + np.arange(len(c["steps_seq"])) for c, idx0 in anchors])
+    a_day = np.concatenate([
+        np.datetime64(c["start_date"], "D") + np.arange(len(c["steps_seq"]))
+        for c, _ in anchors
+    ])
+
+    i = np.arange(len(steps))
+    k = np.searchsorted(a_idx, i, side="right") - 1
+    k[k < 0] = 0
+    days = a_day[k] + (i - a_idx[k])
+
+    # keep-max per date: sort by (date, steps, dist) and take the last of each date
+    order = np.lexsort((dist, steps, days))
+    days, steps, dist = days[order], steps[order], dist[order]
+    last = np.ones(len(days), dtype=bool)
+    last[:-1] = days[1:] != days[:-1]
+    return days[last], steps[last], dist[last]
+
+def build_timeline_columnar(records, matcher, cal_start=CAL_START, cal_end=CAL_END, metrics=None):
+    """
+    Columnar equivalent of the python timeline stages.
+    Returns (timeline rows as dicts, number of mapped dates).
+    """
+    if np is None:
+        raise RuntimeError("--engine numpy requires numpy (pip install numpy)")
+    if metrics is None:
+        metrics = PipelineMetrics()
+
+    cal_days = np.arange(
+        np.datetime64(cal_start.date(), "D"),
+        np.datetime64(cal_end.date(), "D") + 1,
+    )
+    t_steps = np.zeros(len(cal_days), dtype=np.int64)
+    t_dist = np.zeros(len(cal_days), dtype=np.float64)
+
+    mapped = 0
+    by_date = None
+    with metrics.stage("anchoring") as st:
+        if records:
+            steps, dist = records_to_columns(records)
+            by_date = assign_dates_columnar(steps, dist, matcher)
+        st["records"] = len(records)
+
+    with metrics.stage("overlay") as st:
+        if by_date is not None:
+            m_days, m_steps, m_dist = by_date
+            mapped = len(m_days)
+
+            # overlay onto the blank calendar (max w.r.t. the zeros already there)
+            pos = (m_days - cal_days[0]).astype(np.int64)
+            take = (pos >= 0) & (pos < len(cal_days)) & ((m_steps > 0) | ((m_steps == 0) & (m_dist > 0.0)))
+            t_steps[pos[take]] = m_steps[take]
+            t_dist[pos[take]] = m_dist[take]
+        st["mapped_dates"] = mapped
+
+    # first-occurrence dedupe of non-zero steps across dates (later duplicates -> zeros)
+    with metrics.stage("dedupe") as st:
+        _, first = np.unique(t_steps, return_index=True)
+        is_first = np.zeros(len(t_steps), dtype=bool)
+        is_first[first] = True
+        dup = (t_steps != 0) & ~is_first
+        t_steps[dup] = 0
+        t_dist[dup] = 0.0
+        st["days"] = len(cal_days)
+        st["zeroed_duplicates"] = int(dup.sum())
+
+    rows = [
+        {"date": d, "steps": s, "distance_km": x}
+        for d, s, x in zip(np.datetime_as_string(cal_days).tolist(), t_steps.tolist(), t_dist.tolist())
+    ]
+    return rows, mapped
+
+# -------------------- OUTPUT --------------------
+
+CSV_NAME = "steps_summary_pedometer.csv"
+DELTA_CSV_NAME = "steps_summary_pedometer.delta.csv"
+CSV_FIELDS = ["date", "steps", "distance_km"]
+
+def write_timeline_csv(path, rows):
+    """
+    Write timeline rows (sorted by date) as date,steps,distance_km. The file is
+    written next to `path` and renamed over it, so readers never see it half-written.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for r in sorted(rows, key=lambda x: x["date"]):
+                writer.writerow({"date": r["date"], "steps": r["steps"], "distance_km": r["distance_km"]})
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def read_timeline_csv(path):
+    """date -> (steps, distance_km) from a CSV written by write_timeline_csv; {} if missing."""
+    out = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                out[row["date"]] = (int(row["steps"]), float(row["distance_km"]))
+    except FileNotFoundError:
+        pass
+    return out
+
+def key_suffix(key):
+    """'.<key>' with anything outside [a-zA-Z0-9._-] replaced (ProcessAll's SnapshotKey matches), '' for no key."""
+    return "." + re.sub(r"[^a-zA-Z0-9._-]+", "-", key) if key else ""
+
+def keyed_name(name, key):
+    """steps_summary_pedometer.delta.csv -> steps_summary_pedometer.delta.<key>.csv (unchanged without a key)."""
+    base, ext = os.path.splitext(name)
+    return f"{base}{key_suffix(key)}{ext}"
+
+def snapshot_path(output_dir, key=""):
+    """
+    Snapshot of the last timeline a consumer imported. The delta run writes
+    '<snapshot>.pending'; the consumer promotes it (commit_delta_snapshot) only
+    after its import succeeded, so a failed import is re-sent next time.
+    """
+    return os.path.join(output_dir, f".steps_snapshot{key_suffix(key)}.csv")
+
+def compute_delta(previous, rows):
+    """
+    Rows whose (steps, distance_km) differ from the previous snapshot, plus counts:
+    new (date not in snapshot), updated, unchanged, removed (only in snapshot).
+    """
+    changed = []
+    new = updated = 0
+    seen = set()
+    for r in rows:
+        ds = r["date"]
+        seen.add(ds)
+        prev = previous.get(ds)
+        if prev is None:
+            new += 1
+        elif prev != (int(r["steps"]), float(r["distance_km"])):
+            updated += 1
+        else:
+            continue
+        changed.append(r)
+    summary = {
+        "changed": len(changed),
+        "new": new,
+        "updated": updated,
+        "unchanged": len(rows) - len(changed),
+        "removed": sum(1 for ds in previous if ds not in seen),
+    }
+    return changed, summary
+
+def write_delta(output_dir, rows, key=""):
+    """
+    Write the delta CSV and the pending snapshot; returns (delta path, summary,
+    changed rows). Both are named after the key, so consumers sharing an output
+    dir never read each other's delta.
+    """
+    snap = snapshot_path(output_dir, key)
+    changed, summary = compute_delta(read_timeline_csv(snap), rows)
+    delta_csv = os.path.join(output_dir, keyed_name(DELTA_CSV_NAME, key))
+    write_timeline_csv(delta_csv, changed)
+    write_timeline_csv(snap + ".pending", rows)
+    return delta_csv, summary, changed
+
+def commit_delta_snapshot(output_dir, key=""):
+    """Promote the pending snapshot after the delta has been imported."""
+    snap = snapshot_path(output_dir, key)
+    if os.path.exists(snap + ".pending"):
+        os.replace(snap + ".pending", snap)
+        return True
+    return False
+
+# -------------------- BULK IMPORT (FitnessDaily) --------------------
+
+SQL_NAME = "steps_summary_pedometer.upsert.sql"
+LOAD_DATA_NAME = "steps_summary_pedometer.load.tsv"
+LOAD_DATA_SQL_NAME = "steps_summary_pedometer.load.sql"
+
+# Keep-max semantics of ProcessAll's per-row upsert, per dialect.
+_UPSERT_TAIL = {
+    "mysql": (" ON DUPLICATE KEY UPDATE"
+              " Steps = GREATEST(COALESCE(Steps,0), VALUES(Steps)),"
+              " DistanceKm = GREATEST(COALESCE(DistanceKm,0), VALUES(DistanceKm)),"
+              " IsSynthetic = 0;"),
+    "sqlite": (" ON CONFLICT(UserId, Day) DO UPDATE SET"
+               " Steps = MAX(COALESCE(Steps,0), excluded.Steps),"
+               " DistanceKm = MAX(COALESCE(DistanceKm,0), excluded.DistanceKm),"
+               " IsSynthetic = 0;"),
+}
+
+def sql_string(value, dialect="mysql"):
+    """Quote a string literal (MySQL also treats backslash as an escape)."""
+    v = str(value).replace("'", "''")
+    if dialect == "mysql":
+        v = v.replace("\\", "\\\\")
+    return f"'{v}'"
+
+def upsert_statements(rows, user_id, batch=SQL_BATCH, dialect="mysql"):
+    """
+    Yield one INSERT ... VALUES (...),(...) upsert per `batch` rows, each on a
+    single line, so the importer needs rows/batch round trips instead of one per day.
+    """
+    if dialect not in _UPSERT_TAIL:
+        raise ValueError(f"unknown SQL dialect {dialect!r}")
+    if batch < 1:
+        raise ValueError(f"SQL batch must be at least 1, got {batch}")
+    uid = sql_string(user_id, dialect)
+    head = "INSERT INTO FitnessDaily (UserId, Day, Steps, DistanceKm, IsSynthetic) VALUES "
+    rows = sorted(rows, key=lambda x: x["date"])
+    for i in range(0, len(rows), batch):
+        values = ",".join(
+            f"({uid},'{r['date']}',{int(r['steps'])},{float(r['distance_km'])},0)"
+            for r in rows[i:i + batch]
+        )
+        yield head + values + _UPSERT_TAIL[dialect]
+
+def write_upsert_sql(path, rows, user_id, batch=SQL_BATCH, dialect="mysql"):
+    """Write the batched upserts (one statement per line); returns the statement count."""
+    n = 0
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f"-- FitnessDaily upsert: rows={len(rows)} batch={batch} dialect={dialect}\n")
+        for stmt in upsert_statements(rows, user_id, batch, dialect):
+            f.write(stmt + "\n")
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+def write_load_data(output_dir, rows, user_id):
+    """
+    TSV for LOAD DATA LOCAL INFILE plus the MySQL script that loads it into a
+    temporary table and merges it with the same keep-max upsert (LOAD DATA on
+    its own can only REPLACE or IGNORE). Both are named after the user id.
+    Returns (tsv path, sql path).
+    """
+    tsv = os.path.join(output_dir, keyed_name(LOAD_DATA_NAME, user_id))
+    with open(tsv, "w", encoding="utf-8", newline="\n") as f:
+        for r in sorted(rows, key=lambda x: x["date"]):
+            f.write(f"{r['date']}\t{int(r['steps'])}\t{float(r['distance_km'])}\n")
+    uid = sql_string(user_id, "mysql")
+    script = os.path.join(output_dir, keyed_name(LOAD_DATA_SQL_NAME, user_id))
+    with open(script, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f"-- FitnessDaily bulk load: rows={len(rows)}\n")
+        f.write("CREATE TEMPORARY TABLE shealth_steps_load (Day DATE PRIMARY KEY, Steps INT, DistanceKm DECIMAL(10,3));\n")
+        f.write(f"LOAD DATA LOCAL INFILE {sql_string(os.path.abspath(tsv), 'mysql')} INTO TABLE shealth_steps_load "
+                "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' (Day, Steps, DistanceKm);\n")
+        f.write(f"INSERT INTO FitnessDaily (UserId, Day, Steps, DistanceKm, IsSynthetic) "
+                f"SELECT {uid}, Day, Steps, DistanceKm, 0 FROM shealth_steps_load"
+                f"{_UPSERT_TAIL['mysql']}\n")
+        f.write("DROP TEMPORARY TABLE shealth_steps_load;\n")
+    return tsv, script
+
+def verify_upsert_sqlite(rows, user_id, batch=SQL_BATCH):
+    """
+    Run the sqlite flavour of the batched upserts against an in-memory
+    FitnessDaily seeded with higher and lower existing values, and check the
+    keep-max result row by row. Returns (ok, statements, message).
+    """
+    import sqlite3
+    con = sqlite3.connect(":memory:")
+    con.execute("CREATE TABLE FitnessDaily (Id INTEGER PRIMARY KEY, UserId TEXT NOT NULL, Day TEXT NOT NULL,"
+                " Steps INT, DistanceKm REAL, IsSynthetic INT, UNIQUE(UserId, Day))")
+    rows = sorted(rows, key=lambda x: x["date"])
+    seeded = {}
+    for i, r in enumerate(rows[::7]):
+        prev = (int(r["steps"]) + (500 if i % 2 else -500), None if i % 3 == 0 else float(r["distance_km"]) + 1)
+        seeded[r["date"]] = prev
+        con.execute("INSERT INTO FitnessDaily (UserId, Day, Steps, DistanceKm, IsSynthetic) VALUES (?,?,?,?,1)",
+                    (user_id, r["date"], *prev))
+    n = 0
+    for stmt in upsert_statements(rows, user_id, batch, "sqlite"):
+        con.execute(stmt)
+        n += 1
+    got = {d: (s, km, syn) for d, s, km, syn in
+           con.execute("SELECT Day, Steps, DistanceKm, IsSynthetic FROM FitnessDaily WHERE UserId = ?", (user_id,))}
+    for r in rows:
+        steps, km = int(r["steps"]), float(r["distance_km"])
+        if r["date"] in seeded:
+            s0, km0 = seeded[r["date"]]
+            steps, km = max(s0, steps), max(km0 or 0, km)
+        if got.get(r["date"]) != (steps, km, 0):
+            return False, n, f"{r['date']}: expected {(steps, km, 0)}, got {got.get(r['date'])}"
+    if len(got) != len(rows):
+        return False, n, f"expected {len(rows)} rows, got {len(got)}"
+    return True, n, f"{len(rows)} rows in {n} statement(s)"
+
+# -------------------- WORKER MODE --------------------
+
+class DirIndex:
+    """
+    Pedometer folders per RAW_DATA root, reused while the root's top-level
+    entries (the extracted exports) keep the same names and mtimes.
+    """
+
+    def __init__(self):
+        self.roots = {}
+
+    @staticmethod
+    def _signature(raw_root):
+        sig = []
+        for e in _iter_subdirs(raw_root):
+            try:
+                sig.append((e.name, e.stat().st_mtime_ns))
+            except OSError:
+                pass
+        sig.sort()
+        return tuple(sig)
+
+    def pedometer_dirs(self, raw_root):
+        sig = self._signature(raw_root)
+        hit = self.roots.get(raw_root)
+        if hit and hit[0] == sig:
+            return hit[1]
+        dirs = find_all_pedometer_dirs(raw_root)
+        self.roots[raw_root] = (sig, dirs)
+        return dirs
+
+class PipelineWorker:
+    """
+    Serves pipeline jobs in one interpreter. Parse caches (per cache file), the
+    directory index and compiled cluster matchers stay in memory between jobs.
+
+    A job is one JSON object; every key is optional:
+      {"id": ..., "raw_data": ..., "output_dir": ..., "zip_dir": ..., "parse_cache": ...,
+       "args": ["--delta", "--delta-key", "42", ...], "commit_delta": false}
+    Paths default to the worker's SHEALTH_* environment, "args" are the usual
+    CLI flags. The reply echoes "id" and carries ok, csv, delta_csv, delta,
+    metrics (the same document --metrics writes) and the job's log lines.
+
+    Jobs always parse serially (--workers is ignored): pool children don't
+    see the job's stdout capture, so their [READ FAIL] lines would either land
+    on the reply stream (spawn, e.g. Windows) or be lost (fork). The warm parse
+    cache makes repeat jobs cheap anyway.
+    """
+
+    def __init__(self):
+        self.caches = {}
+        self.matchers = {}
+        self.dir_index = DirIndex()
+        self.jobs = 0
+
+    def _cache(self, path):
+        if not path or path.lower() == "off":
+            return None
+        if path not in self.caches:
+            self.caches[path] = ParseCache.load(path)
+        return self.caches[path]
+
+    def _matcher(self, clusters_path):
+        key = clusters_path or ""
+        mtime = os.stat(clusters_path).st_mtime_ns if clusters_path else 0
+        hit = self.matchers.get(key)
+        if hit is None or hit[0] != mtime:
+            clusters = load_clusters(clusters_path) if clusters_path else CLUSTERS
+            start, end = calendar_range(clusters)
+            hit = (mtime, ClusterMatcher(clusters), start, end)
+            self.matchers[key] = hit
+        return hit[1:]
+
+    def run(self, job):
+        args = parse_args(job.get("args") or [])
+        if resolve_workers(args.workers) > 1:
+            print(f"[INFO] worker mode parses serially (ignoring --workers {args.workers})")
+            args.workers = 1
+        raw_root = job.get("raw_data") or RAW_DATA_ROOT
+        output_dir = job.get("output_dir") or job.get("raw_data") or OUTPUT_DIR
+        if job.get("commit_delta"):
+            return {"committed": commit_delta_snapshot(output_dir, args.delta_key)}
+
+        zip_dir = (job.get("zip_dir") or ZIP_DIR) if args.source == "zip" else None
+        cache_path = job.get("parse_cache")
+        if cache_path is None:
+            cache_path = PARSE_CACHE_PATH if output_dir == OUTPUT_DIR else os.path.join(output_dir, ".steps_parse_cache.json")
+        matcher, cal_start, cal_end = self._matcher(args.clusters)
+
+        metrics = PipelineMetrics()
+        result = run_pipeline(args, raw_root, output_dir, zip_dir, self._cache(cache_path),
+                              matcher, cal_start, cal_end, metrics, self.dir_index)
+        metrics.counters.update(_run_counters(args, result))
+        metrics.counters["worker_job"] = self.jobs
+        if args.metrics:
+            metrics.emit(args.metrics)
+        result["metrics"] = metrics.to_doc()
+        return result
+
+    def handle_line(self, line):
+        """One NDJSON request line -> one reply line (never raises)."""
+        log = io.StringIO()
+        job = {}
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+            with redirect_stdout(log):
+                reply = {"ok": True, **self.run(job)}
+        except SystemExit as e:  # argparse rejected "args"
+            reply = {"ok": False, "error": f"bad args (exit {e.code})"}
+        except Exception as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.jobs += 1
+        if isinstance(job, dict) and "id" in job:
+            reply["id"] = job["id"]
+        reply["log"] = log.getvalue().splitlines()
+        return json.dumps(reply, default=str)
+
+def serve(endpoint):
+    """Run a PipelineWorker on 'stdin' (replies on stdout) or 'unix:/path/to.sock'."""
+    worker = PipelineWorker()
+    if endpoint == "stdin":
+        out = sys.stdout
+        print(f"[INFO] worker ready on stdin (pid {os.getpid()})", file=sys.stderr)
+        for line in sys.stdin:
+            if line.strip():
+                out.write(worker.handle_line(line) + "\n")
+                out.flush()
+        return
+    if not endpoint.startswith("unix:"):
+        raise SystemExit(f"--serve expects 'stdin' or 'unix:/path', got {endpoint!r}")
+
+    sock_path = endpoint[len("unix:"):]
+    if os.path.exists(sock_path):
+        os.remove(sock_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode("utf-8")
+                if line.strip():
+                    self.wfile.write((worker.handle_line(line) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+    # one connection at a time: jobs share the warm state and run serially
+    with socketserver.UnixStreamServer(sock_path, Handler) as server:
+        print(f"[INFO] worker listening on {sock_path} (pid {os.getpid()})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(sock_path)
+
+# -------------------- BATCH MODE --------------------
+
+def load_batch_manifest(path):
+    """
+    Batch manifest: a JSON list (or {"users": [...]}) of
+      {"user_id": "...", "raw_data": "...", "output_dir": "...",
+       optional "zip_dir", "parse_cache", "delta_key" and "sql_user" (both default: user_id)}.
+    output_dir defaults to raw_data; no two users may resolve to the same
+    output_dir, since the CSV, delta, SQL and metrics names are fixed.
+    """
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    if isinstance(doc, dict):
+        doc = doc.get("users")
+    if not isinstance(doc, list) or not doc:
+        raise ValueError(f"{path}: expected a non-empty list of users")
+    entries = []
+    for i, e in enumerate(doc):
+        if not isinstance(e, dict) or not e.get("user_id") or not e.get("raw_data"):
+            raise ValueError(f"{path}: entry {i} needs user_id and raw_data")
+        e = dict(e)
+        e["user_id"] = str(e["user_id"])
+        e.setdefault("output_dir", e["raw_data"])
+        e.setdefault("delta_key", e["user_id"])
+        e["sql_user"] = str(e.get("sql_user") or e["user_id"])
+        entries.append(e)
+    owners = {}
+    for e in entries:
+        key = os.path.normcase(os.path.abspath(e["output_dir"]))
+        if key in owners:
+            raise ValueError(f"{path}: users {owners[key]!r} and {e['user_id']!r} both write to {e['output_dir']} "
+                             "(their CSV/delta/SQL/metrics files would overwrite each other); "
+                             "give each user its own output_dir")
+        owners[key] = e["user_id"]
+    return entries
+
+def group_batch_entries(entries, source):
+    """
+    Users that read the same export tree are discovered and parsed once,
+    through one parse cache. A tree is only split into several groups when
+    entries explicitly name different "parse_cache" files; entries without
+    one join the tree's first group (whose default cache lives in its first
+    user's output_dir). Returns [[entry, ...], ...] in manifest order, each
+    entry with its resolved "parse_cache".
+    """
+    groups = {}
+    for e in entries:
+        src = (e.get("zip_dir") or ZIP_DIR) if source == "zip" else e["raw_data"]
+        tree = (source, os.path.abspath(src))
+        cache = e.get("parse_cache")
+        key = None
+        if cache is None:
+            key = next((k for k in groups if k[:2] == tree), None)
+            cache = os.path.join(e["output_dir"], ".steps_parse_cache.json")
+        if key is None:
+            key = tree + (cache if cache.lower() == "off" else os.path.abspath(cache),)
+        groups.setdefault(key, []).append(dict(e, parse_cache=key[2]))
+    return list(groups.values())
+
+def _run_batch_group(args, group, matcher, cal_start, cal_end):
+    """One pool task: parse a group's export tree once, then write each user's outputs."""
+    first = group[0]
+    log = io.StringIO()
+    results = []
+    with redirect_stdout(log):
+        shared = PipelineMetrics()
+        zip_dir = (first.get("zip_dir") or ZIP_DIR) if args.source == "zip" else None
+        cache_path = first["parse_cache"]
+        cache = ParseCache.load(cache_path) if cache_path and cache_path.lower() != "off" else None
+        records, nonzero = collect_records(args, first["raw_data"], zip_dir, cache, shared)
+        for e in group:
+            metrics = PipelineMetrics()
+            metrics.stages = [dict(st, shared_with=len(group)) for st in shared.stages] if len(group) > 1 \
+                else list(shared.stages)
+            user_args = argparse.Namespace(**{**vars(args), "delta_key": e["delta_key"], "sql_user": e["sql_user"]})
+            print(f"[INFO] user {e['user_id']}: {e['output_dir']}")
+            result = build_outputs(user_args, records, nonzero, e["output_dir"], matcher, cal_start, cal_end, metrics)
+            metrics.counters.update(_run_counters(user_args, result))
+            metrics.counters["user_id"] = e["user_id"]
+            metrics.emit(e.get("metrics") or os.path.join(e["output_dir"], "steps_pipeline.metrics.json"))
+            result.update({"user_id": e["user_id"], "wall_s": metrics.to_doc()["total_wall_s"]})
+            results.append(result)
+    return results, log.getvalue()
+
+def run_batch(args, manifest_path):
+    """
+    Process every manifest user in a process pool (one task per distinct
+    export tree). The cluster config is compiled once here and shipped to the
+    tasks; each user gets their own CSV, delta and metrics file.
+    """
+    try:
+        entries = load_batch_manifest(manifest_path)
+    except ValueError as e:
+        raise SystemExit(f"--batch: {e}")
+    t0 = time.perf_counter()
+    clusters = load_clusters(args.clusters) if args.clusters else CLUSTERS
+    matcher = ClusterMatcher(clusters)
+    cal_start, cal_end = calendar_range(clusters)
+    groups = group_batch_entries(entries, args.source)
+    pool_size = min(resolve_workers(args.batch_workers), len(groups))
+    if args.sql_user:
+        print(f"[WARN] batch: ignoring --sql-user/SHEALTH_SQL_USER={args.sql_user!r}; "
+              "each user's rows use the manifest sql_user (default: user_id)")
+    args = argparse.Namespace(**{**vars(args), "workers": 1})  # parallelism is across users
+    trees = len({(g[0].get("zip_dir") or ZIP_DIR) if args.source == "zip" else os.path.abspath(g[0]["raw_data"])
+                 for g in groups})
+    print(f"[INFO] batch: {len(entries)} user(s), {trees} export tree(s) in {len(groups)} parse group(s), "
+          f"{pool_size} process(es)")
+
+    summary = {"users": [], "failed": []}
+    if pool_size <= 1:
+        outcomes = []
+        for g in groups:
+            try:
+                outcomes.append((g, _run_batch_group(args, g, matcher, cal_start, cal_end), None))
+            except Exception as e:
+                outcomes.append((g, None, e))
+    else:
+        with ProcessPoolExecutor(max_workers=pool_size) as ex:
+            futures = [(g, ex.submit(_run_batch_group, args, g, matcher, cal_start, cal_end)) for g in groups]
+            outcomes = []
+            for g, fut in futures:
+                try:
+                    outcomes.append((g, fut.result(), None))
+                except Exception as e:
+                    outcomes.append((g, None, e))
+
+    for g, out, err in outcomes:
+        if err is not None:
+            for e in g:
+                print(f"[WARN] user {e['user_id']} failed: {type(err).__name__}: {err}")
+                summary["failed"].append({"user_id": e["user_id"], "error": f"{type(err).__name__}: {err}"})
+            continue
+        results, log = out
+        sys.stdout.write(log)
+        summary["users"].extend(results)
+
+    summary["total_wall_s"] = round(time.perf_counter() - t0, 6)
+    print(f"[OK] batch: {len(summary['users'])} user(s) written, {len(summary['failed'])} failed "
+          f"in {summary['total_wall_s']:.2f}s")
+    if args.metrics:
+        doc = json.dumps(summary, indent=None if args.metrics == "-" else 2, default=str)
+        if args.metrics == "-":
+            print(doc)
+        else:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(doc)
+            print(f"[OK] Metrics: {args.metrics}")
+    return summary
+
+# -------------------- WATCH MODE --------------------
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_IN_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_IN_EVENT = struct.Struct("iIII")
+
+def _watch_prune(name, parent_name):
+    """Same pruning as find_all_pedometer_dirs: only the pedometer tracker under jsons/."""
+    if name.startswith("."):
+        return True
+    if name.startswith("com.samsung."):
+        return not (name == PEDOMETER_DIR_NAME and parent_name == "jsons")
+    return False
+
+class InotifyWatcher:
+    """
+    Linux inotify on every relevant directory under root (via libc, no extra
+    packages). New directories are watched as they appear, so a ZIP being
+    extracted is followed all the way down. Only binning files and directories
+    count as changes, so CSVs written into RAW_DATA do not retrigger a run.
+    """
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wds = {}
+        self._add_tree(root, None)
+        if not self.wds:
+            os.close(self.fd)
+            raise OSError(f"cannot watch {root}")
+
+    def _add_tree(self, path, parent_name):
+        stack = [(path, parent_name)]
+        while stack:
+            p, parent = stack.pop()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(p), _IN_MASK)
+            if wd < 0:
+                continue
+            self.wds[wd] = p
+            name = os.path.basename(os.path.normpath(p))
+            for e in _iter_subdirs(p):
+                if not _watch_prune(e.name, name):
+                    stack.append((e.path, name))
+
+    def wait(self, timeout):
+        """
+        Block up to `timeout` seconds (None = forever); True as soon as something
+        relevant changed. Irrelevant events (CSVs, other trackers' files) are
+        drained and the wait goes on, so they can't cut a debounce short.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self):
+        """Read every queued event; True if any of them is relevant."""
+        changed = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            off = 0
+            while off < len(buf):
+                wd, mask, _cookie, length = _IN_EVENT.unpack_from(buf, off)
+                off += _IN_EVENT.size
+                name = buf[off:off + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                off += length
+                if mask & IN_Q_OVERFLOW:
+                    changed = True
+                elif mask & IN_ISDIR:
+                    parent = self.wds.get(wd)
+                    if parent is None:
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not _watch_prune(name, os.path.basename(parent)):
+                        self._add_tree(os.path.join(parent, name), os.path.basename(parent))
+                    changed = True
+                elif mask & IN_DELETE_SELF:
+                    self.wds.pop(wd, None)
+                elif name.endswith(BINNING_SUFFIX):
+                    changed = True
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback: rescan the binning files every interval and compare (path, size, mtime)."""
+
+    def __init__(self, root, interval):
+        self.root = root
+        self.interval = interval
+        self.last = self._signature()
+
+    def _signature(self):
+        sig = set()
+        for d in find_all_pedometer_dirs(self.root):
+            for fp, st in find_all_binning_files_in_dir(d):
+                sig.add((fp, st.st_size, st.st_mtime_ns))
+        return frozenset(sig)
+
+    def wait(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            step = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if step > 0:
+                time.sleep(step)
+            sig = self._signature()
+            if sig != self.last:
+                self.last = sig
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        pass
+
+class _ZipDirWatcher(PollingWatcher):
+    """Polls ZIP_FILES for added/replaced/removed archives."""
+
+    def _signature(self):
+        sig = set()
+        try:
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if e.name.lower().endswith(".zip") and e.is_file():
+                        st = e.stat()
+                        sig.add((e.name, st.st_size, st.st_mtime_ns))
+        except OSError:
+            pass
+        return frozenset(sig)
+
+def make_watcher(root, poll_interval, force_poll=False):
+    if not force_poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            print(f"[WARN] inotify unavailable ({e}); polling every {poll_interval:g}s")
+    return PollingWatcher(root, poll_interval)
+
+def watch(args):
+    """
+    Recompute the timeline whenever binning files land under RAW_DATA (or new
+    archives in ZIP_FILES with --source zip). Bursts of events, e.g. a ZIP
+    extraction, are debounced until the tree has been quiet for --debounce
+    seconds. The parse cache stays in memory, so each rerun only parses new
+    or changed files; the CSVs are replaced atomically.
+    """
+    zip_dir = ZIP_DIR if args.source == "zip" else None
+    root = zip_dir or RAW_DATA_ROOT
+    clusters = load_clusters(args.clusters) if args.clusters else CLUSTERS
+    matcher = ClusterMatcher(clusters)
+    cal_start, cal_end = calendar_range(clusters)
+    cache = None
+    if PARSE_CACHE_PATH and PARSE_CACHE_PATH.lower() != "off":
+        cache = ParseCache.load(PARSE_CACHE_PATH)
+
+    def run_once(reason):
+        print(f"[INFO] watch: run ({reason}) at {datetime.now().isoformat(timespec='seconds')}")
+        metrics = PipelineMetrics()
+        try:
+            result = run_pipeline(args, RAW_DATA_ROOT, OUTPUT_DIR, zip_dir, cache, matcher, cal_start, cal_end, metrics)
+        except Exception as e:
+            print(f"[WARN] watch: run failed: {type(e).__name__}: {e}")
+            return
+        if args.metrics:
+            metrics.counters.update(_run_counters(args, result))
+            metrics.emit(args.metrics)
+        sys.stdout.flush()
+
+    os.makedirs(root, exist_ok=True)
+    if zip_dir:
+        # archives are flat files, so poll the directory listing
+        watcher = _ZipDirWatcher(zip_dir, args.poll_interval)
+    else:
+        watcher = make_watcher(root, args.poll_interval, force_poll=args.poll)
+    print(f"[INFO] watch: {type(watcher).__name__} on {root} (debounce {args.debounce:g}s)")
+    run_once("startup")
+    try:
+        while True:
+            if not watcher.wait(None):
+                continue
+            events = 1
+            while watcher.wait(args.debounce):
+                events += 1
+            run_once(f"{events} event batch(es)")
+    except KeyboardInterrupt:
+        print("[INFO] watch: stopped")
+    finally:
+        watcher.close()
+
 # -------------------- MAIN --------------------
 
-def main():
-    # 1) Build the timeline FIRST (so it never gets wiped)
-    timeline = create_blank_timeline(CAL_START, CAL_END)
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Build steps_summary_pedometer.csv from Samsung Health exports.")
+    ap.add_argument("--workers", type=int, default=PARSE_WORKERS,
+                    help="parser processes (1 = serial, 0 = all cores; env SHEALTH_PARSE_WORKERS)")
+    ap.add_argument("--source", choices=("raw", "zip"), default=SOURCE,
+                    help="read extracted RAW_DATA folders or the ZIP_FILES archives (env SHEALTH_SOURCE)")
+    ap.add_argument("--clusters", default=CLUSTERS_PATH,
+                    help="JSON file with anchor clusters (env SHEALTH_CLUSTERS; default: built-in CLUSTERS)")
+    ap.add_argument("--engine", choices=("python", "numpy"), default=ENGINE,
+                    help="timeline engine; numpy is columnar and writes the same CSV (env SHEALTH_ENGINE)")
+    ap.add_argument("--metrics", default=METRICS_PATH,
+                    help="write per-stage metrics JSON to this path, '-' for stdout (env SHEALTH_METRICS)")
+    ap.add_argument("--delta", action="store_true", default=DELTA,
+                    help=f"also write {DELTA_CSV_NAME} (.delta.<key>.csv with --delta-key) with only the dates changed since the last "
+                         "committed snapshot (env SHEALTH_DELTA=1)")
+    ap.add_argument("--delta-key", default=DELTA_KEY,
+                    help="snapshot name for --delta / --commit-delta, e.g. the importing user id (env SHEALTH_DELTA_KEY)")
+    ap.add_argument("--commit-delta", action="store_true",
+                    help="promote the pending snapshot after a successful import, then exit")
+    ap.add_argument("--batch", default="",
+                    help="JSON manifest of users (user_id, raw_data, output_dir, ...) processed "
+                         "concurrently, one CSV + metrics file per user")
+    ap.add_argument("--batch-workers", type=int, default=0,
+                    help="processes for --batch (0 = all cores)")
+    ap.add_argument("--rollup", action="store_true", default=ROLLUP,
+                    help="also write <csv>.rollup.json with weekly/monthly/yearly sums and 7/30-day "
+                         "rolling means (env SHEALTH_ROLLUP=1)")
+    ap.add_argument("--sql", choices=("", "sql", "load-data"), default=SQL_MODE,
+                    help="also write FitnessDaily bulk-import files: batched upserts (steps_summary_pedometer.upsert.<user>.sql) "
+                         "or a LOAD DATA LOCAL INFILE TSV + script (env SHEALTH_SQL)")
+    ap.add_argument("--sql-user", default=SQL_USER,
+                    help="FitnessDaily.UserId for --sql rows (env SHEALTH_SQL_USER; default: --delta-key; "
+                         "--batch uses each manifest entry's sql_user instead)")
+    ap.add_argument("--sql-batch", type=int, default=SQL_BATCH,
+                    help="rows per upsert statement (env SHEALTH_SQL_BATCH)")
+    ap.add_argument("--sql-dialect", choices=("mysql", "sqlite"), default=SQL_DIALECT,
+                    help="upsert syntax for --sql sql (env SHEALTH_SQL_DIALECT)")
+    ap.add_argument("--verify-sqlite", action="store_true",
+                    help="with --sql: replay the upserts on an in-memory SQLite FitnessDaily and check keep-max")
+    ap.add_argument("--watch", action="store_true",
+                    help="keep running and recompute the CSV whenever binning files are added or changed")
+    ap.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                    help="--watch: seconds without events before re-running (env SHEALTH_WATCH_DEBOUNCE)")
+    ap.add_argument("--poll", action="store_true",
+                    help="--watch: scan periodically instead of using inotify")
+    ap.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL,
+                    help="--watch: seconds between scans when polling (env SHEALTH_WATCH_POLL)")
+    ap.add_argument("--serve", default="",
+                    help="long-running worker: read NDJSON jobs from 'stdin' or 'unix:/path/to.sock' "
+                         "and keep parsed records warm between them")
+    ap.add_argument("--profile", choices=("", "cprofile", "tracemalloc"), default=PROFILE,
+                    help="cprofile: dump steps_pipeline.prof + top functions; tracemalloc: per-stage "
+                         "allocation peaks in the metrics (env SHEALTH_PROFILE)")
+    args = ap.parse_args(argv)
+    if args.sql_batch < 1:
+        ap.error(f"--sql-batch must be at least 1 (got {args.sql_batch}; env SHEALTH_SQL_BATCH)")
+    return args
 
-    # 2) Discover & parse ALL records across ALL exports / pedometer folders
-    records = discover_all_records(RAW_DATA_ROOT)
+def _print_profile(profiler, out_path):
+    import pstats
+    profiler.dump_stats(out_path)
+    print(f"[OK] Profile: {out_path}")
+    pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(25)
+
+def run_pipeline(args, raw_root, output_dir, zip_dir, cache, matcher, cal_start, cal_end,
+                 metrics, dir_index=None):
+    """
+    Steps 1-7 for one export tree. Returns a result dict (csv, delta_csv,
+    delta, records, nonzero_records); per-stage timings land on `metrics`.
+    """
+    records, nonzero = collect_records(args, raw_root, zip_dir, cache, metrics, dir_index)
+    return build_outputs(args, records, nonzero, output_dir, matcher, cal_start, cal_end, metrics)
+
+def collect_records(args, raw_root, zip_dir, cache, metrics, dir_index=None):
+    """Step 2: discover & parse (through the cache); returns (records, non-zero count)."""
+    if cache is not None:
+        cache.begin_run()
+    records = discover_all_records(raw_root, cache, args.workers, zip_dir, metrics, dir_index)
+    if cache is not None:
+        with metrics.stage("cache_save") as st:
+            cache.save()
+            st["entries"] = len(cache.entries)
+        print(f"[INFO] parse cache: {cache.hits} hits, {cache.misses} misses, {cache.evicted} evicted")
     print(f"[INFO] candidate records parsed: {len(records)}")
-    nonzero = sum(1 for r in records if r and (r["steps"] > 0 or r["distance_km"] > 0))
+    nonzero = sum(1 for r in records if r and (r.steps > 0 or r.distance_km > 0))
     print(f"[INFO] non-zero records: {nonzero}")
+    return records, nonzero
+
+def build_outputs(args, records, nonzero, output_dir, matcher, cal_start, cal_end, metrics):
+    """Steps 1 and 3-7 on already parsed records: timeline, CSV and optional delta."""
+    # 1) Build the timeline FIRST (so it never gets wiped)
+    if args.engine != "numpy":
+        with metrics.stage("timeline"):
+            timeline = create_blank_timeline(cal_start, cal_end)
 
-    # 3) Anchor clusters and compute a date->record map (may be empty)
-    date_map = assign_dates_map(records)
-    print(f"[INFO] mapped dates from records: {len(date_map)}")
+    if args.engine == "numpy":
+        # 3-5) columnar anchor → overlay → dedupe
+        timeline, mapped = build_timeline_columnar(records, matcher, cal_start, cal_end, metrics)
+        print(f"[INFO] mapped dates from records: {mapped}")
+    else:
+        # 3) Anchor clusters and compute a date->record map (may be empty)
+        with metrics.stage("anchoring") as st:
+            date_map = assign_dates_map(records, matcher)
+            st["records"] = len(records)
+        print(f"[INFO] mapped dates from records: {len(date_map)}")
 
-    # 4) INSERT genuine data AFTER the timeline is built
-    timeline = insert_data_after_timeline(timeline, date_map)
+        # 4) INSERT genuine data AFTER the timeline is built
+        with metrics.stage("overlay") as st:
+            timeline = insert_data_after_timeline(timeline, date_map)
+            st["mapped_dates"] = len(date_map)
 
-    # 5) Dedupe same steps across dates BUT preserve the timeline (later duplicates -> zeros)
-    timeline = dedupe_across_dates_preserve_timeline(timeline)
+        # 5) Dedupe same steps across dates BUT preserve the timeline (later duplicates -> zeros)
+        with metrics.stage("dedupe") as st:
+            timeline = dedupe_across_dates_preserve_timeline(timeline)
+            st["days"] = len(timeline)
 
     # 6) Write CSV
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    pedometer_csv = os.path.join(OUTPUT_DIR, "steps_summary_pedometer.csv")
-    with open(pedometer_csv, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=["date", "steps", "distance_km"])
-        writer.writeheader()
-        for r in sorted(timeline, key=lambda x: x["date"]):
-            writer.writerow({"date": r["date"], "steps": r["steps"], "distance_km": r["distance_km"]})
+    with metrics.stage("csv_write") as st:
+        os.makedirs(output_dir, exist_ok=True)
+        pedometer_csv = os.path.join(output_dir, CSV_NAME)
+        write_timeline_csv(pedometer_csv, timeline)
+        st["rows"] = len(timeline)
+        st["bytes"] = os.path.getsize(pedometer_csv)
     print(f"[OK] Wrote: {pedometer_csv}")
+    result = {"csv": pedometer_csv, "records": len(records), "nonzero_records": nonzero}
+
+    # 6b) Optional multi-resolution rollups next to the CSV
+    if args.rollup:
+        import shealth_rollup
+        with metrics.stage("rollup") as st:
+            doc = shealth_rollup.compute_rollups((r["date"], r["steps"], r["distance_km"]) for r in timeline)
+            rollup_json = shealth_rollup.write_rollups(doc, shealth_rollup.rollup_path_for(pedometer_csv))
+            st["days"] = len(doc["daily"]["date"])
+            st["bytes"] = os.path.getsize(rollup_json)
+        print(f"[OK] Wrote: {rollup_json}")
+        result["rollup"] = rollup_json
+
+    # 7) Optional delta against the last committed snapshot
+    if args.delta:
+        with metrics.stage("delta") as st:
+            delta_csv, summary, changed = write_delta(output_dir, timeline, args.delta_key)
+            st.update(summary)
+        metrics.counters["delta"] = summary
+        print(f"[INFO] delta: {summary['changed']} changed ({summary['new']} new, {summary['updated']} updated), "
+              f"{summary['unchanged']} unchanged, {summary['removed']} removed")
+        print(f"[OK] Wrote: {delta_csv}")
+        result.update({"delta_csv": delta_csv, "delta": summary})
+
+    # 8) Optional bulk-import files for FitnessDaily (the delta rows when --delta is on),
+    #    named after the user id so concurrent imports into one output dir stay apart
+    if args.sql:
+        import_rows = changed if args.delta else timeline
+        user_id = args.sql_user or args.delta_key
+        if not user_id:
+            raise ValueError("--sql needs --sql-user (or --delta-key) for FitnessDaily.UserId")
+        with metrics.stage("sql_write") as st:
+            if args.sql == "load-data":
+                tsv, script = write_load_data(output_dir, import_rows, user_id)
+                result.update({"load_data": tsv, "sql": script})
+            else:
+                path = os.path.join(output_dir, keyed_name(SQL_NAME, user_id))
+                st["statements"] = write_upsert_sql(path, import_rows, user_id, args.sql_batch, args.sql_dialect)
+                result.update({"sql": path, "sql_statements": st["statements"]})
+            st["rows"] = len(import_rows)
+        print(f"[OK] Wrote: {result['sql']} ({len(import_rows)} rows"
+              + (f", {result['sql_statements']} statements)" if "sql_statements" in result else ")"))
+        if args.verify_sqlite:
+            ok, _, msg = verify_upsert_sqlite(import_rows, user_id, args.sql_batch)
+            result["sqlite_verified"] = ok
+            print(f"[OK] SQLite upsert check: {msg}" if ok else f"[WARN] SQLite upsert check failed: {msg}")
+    return result
+
+def _run_counters(args, result):
+    return {
+        "engine": args.engine,
+        "source": args.source,
+        "workers": resolve_workers(args.workers),
+        "records": result["records"],
+        "nonzero_records": result["nonzero_records"],
+        "csv": result["csv"],
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.commit_delta:
+        ok = commit_delta_snapshot(OUTPUT_DIR, args.delta_key)
+        print("[OK] Snapshot committed" if ok else "[INFO] No pending snapshot")
+        return
+    if args.serve:
+        serve(args.serve)
+        return
+    if args.watch:
+        watch(args)
+        return
+    if args.batch:
+        summary = run_batch(args, args.batch)
+        if summary["failed"]:
+            sys.exit(1)
+        return
+
+    metrics = PipelineMetrics(trace_alloc=args.profile == "tracemalloc")
+    if args.profile == "tracemalloc":
+        tracemalloc.start()
+    profiler = None
+    if args.profile == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    clusters = load_clusters(args.clusters) if args.clusters else CLUSTERS
+    matcher = ClusterMatcher(clusters)
+    cal_start, cal_end = calendar_range(clusters)
+
+    cache = None
+    if PARSE_CACHE_PATH and PARSE_CACHE_PATH.lower() != "off":
+        cache = ParseCache.load(PARSE_CACHE_PATH)
+    zip_dir = ZIP_DIR if args.source == "zip" else None
+    result = run_pipeline(args, RAW_DATA_ROOT, OUTPUT_DIR, zip_dir, cache, matcher, cal_start, cal_end, metrics)
+
+    if profiler is not None:
+        profiler.disable()
+        _print_profile(profiler, os.path.join(OUTPUT_DIR, "steps_pipeline.prof"))
+
+    if args.metrics:
+        metrics.counters.update(_run_counters(args, result))
+        metrics.emit(args.metrics)
 
 if __name__ == "__main__":
     main()
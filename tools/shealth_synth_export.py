@@ -0,0 +1,172 @@
+"""
+Synthetic Samsung Health export generator for exercising / benchmarking
+shealth_steps_pipeline.py without a real phone export.
+
+Writes RAW_DATA-style trees:
+  <out>/samsunghealth_<label>_<stamp>/samsunghealth_user_<stamp>/jsons/
+      com.samsung.shealth.tracker.pedometer_day_summary/<0..f>/<uuid>.binning_data.json
+plus a few unrelated com.samsung.* tracker folders and CSVs, one binning file
+per day with a mix of schemas (list of bins, {"binning_data": [...]} container,
+single-object aggregate). The anchor CLUSTERS are embedded on their dates so
+the pipeline can reconstruct the calendar.
+
+Usage:
+  python shealth_synth_export.py OUT_DIR [--start 2021-11-01] [--days 1500]
+         [--exports 3] [--disjoint] [--seed 1] [--zip ZIP_DIR]
+"""
+
+import os
+import json
+import random
+import shutil
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import shealth_steps_pipeline as pipeline
+
+SCHEMAS = ("list", "container", "single")
+OTHER_TRACKERS = (
+    "com.samsung.shealth.tracker.heart_rate",
+    "com.samsung.shealth.tracker.pedometer_step_count",
+    "com.samsung.health.floors_climbed",
+)
+
+def cluster_steps_by_date(clusters):
+    """date -> steps for every day covered by an anchor cluster."""
+    out = {}
+    for c in clusters:
+        d0 = datetime.strptime(c["start_date"], "%Y-%m-%d").date()
+        for off, steps in enumerate(c["steps_seq"]):
+            out[d0 + timedelta(days=off)] = steps
+    return out
+
+def make_day_payload(rng, day, steps, schema, bins=144):
+    """Binning JSON for one day holding exactly `steps` steps, in the given schema."""
+    start_ms = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+    meters = round(steps * rng.uniform(0.68, 0.78), 1)
+    if schema == "single":
+        return {
+            "mBestSteps": steps,
+            "mDistance": meters,
+            "mBestStepsDate": start_ms,
+        }
+
+    # spread the steps over 10-minute bins (Samsung's pedometer_day_summary layout)
+    weights = [rng.random() ** 3 for _ in range(bins)]
+    total_w = sum(weights) or 1.0
+    counts = [int(steps * w / total_w) for w in weights]
+    counts[rng.randrange(bins)] += steps - sum(counts)
+    items = [
+        {
+            "mStepCount": n,
+            "mWalkStepCount": n,
+            "mRunStepCount": 0,
+            "mDistance": round(meters * n / steps, 3) if steps else 0.0,
+            "mCalorie": round(n * 0.04, 3),
+            "mSpeed": round(rng.uniform(0.9, 1.6), 3) if n else 0.0,
+        }
+        for n in counts
+    ]
+    if schema == "list":
+        return items
+    return {"binning_data": items, "mStartTime": start_ms}
+
+def write_export(rng, root, label, stamp, first_day, days, steps_for, schema_mix):
+    """Write one export folder covering `days` days from first_day; returns the file count."""
+    export = os.path.join(root, f"samsunghealth_{label}_{stamp}", f"samsunghealth_user_{stamp[:12]}")
+    jsons = os.path.join(export, "jsons")
+    pedo = os.path.join(jsons, pipeline.PEDOMETER_DIR_NAME)
+    for sub in "0123456789abcdef":
+        os.makedirs(os.path.join(pedo, sub), exist_ok=True)
+
+    # unrelated trackers / CSVs the pipeline has to skip
+    for tracker in OTHER_TRACKERS:
+        tdir = os.path.join(jsons, tracker, "0")
+        os.makedirs(tdir, exist_ok=True)
+        with open(os.path.join(tdir, f"{tracker}.{rng.getrandbits(64):016x}.binning_data.json"), "w") as f:
+            json.dump([{"value": rng.randint(50, 150)}], f)
+    with open(os.path.join(export, f"{pipeline.PEDOMETER_DIR_NAME}.{stamp[:12]}.csv"), "w") as f:
+        f.write("day_time,step_count\n")
+
+    for k in range(days):
+        day = first_day + timedelta(days=k)
+        steps = steps_for(day)
+        schema = rng.choices(SCHEMAS, weights=schema_mix)[0]
+        uid = "%032x" % rng.getrandbits(128)
+        path = os.path.join(pedo, uid[0], f"{pipeline.PEDOMETER_DIR_NAME}.{uid}.binning_data.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(make_day_payload(rng, day, steps, schema), f, separators=(",", ":"))
+        # mtime follows the day so mtime ordering matches the calendar
+        ts = datetime(day.year, day.month, day.day, 23, 59, tzinfo=timezone.utc).timestamp()
+        os.utime(path, (ts, ts))
+    return days
+
+def generate(out_dir, start, days, exports=1, disjoint=False, seed=1,
+             clusters=None, schema_mix=(0.6, 0.3, 0.1), zip_dir=None):
+    """
+    Generate `exports` exports covering start..start+days-1. By default every
+    export is cumulative (a later export repeats all earlier days and adds
+    more, like real repeated phone exports); with disjoint=True the range is
+    split between them. Returns the number of binning files written.
+    """
+    rng = random.Random(seed)
+    anchors = cluster_steps_by_date(clusters if clusters is not None else pipeline.CLUSTERS)
+    anchor_values = set(anchors.values())
+
+    daily = {}
+    def steps_for(day):
+        if day in anchors:
+            return anchors[day]
+        if day not in daily:
+            s = 0 if rng.random() < 0.03 else int(rng.lognormvariate(8.6, 0.45))
+            while s in anchor_values:
+                s += 1
+            daily[day] = s
+        return daily[day]
+
+    os.makedirs(out_dir, exist_ok=True)
+    total = 0
+    for e in range(exports):
+        if disjoint:
+            lo = days * e // exports
+            hi = days * (e + 1) // exports
+        else:
+            lo = 0
+            hi = days - (exports - 1 - e) * (days // (exports * 2))
+        stamp = (start + timedelta(days=hi)).strftime("%Y%m%d") + "%06d" % e
+        total += write_export(rng, out_dir, f"synth{e}", stamp, start + timedelta(days=lo), hi - lo,
+                              steps_for, schema_mix)
+
+    if zip_dir:
+        os.makedirs(zip_dir, exist_ok=True)
+        for name in sorted(os.listdir(out_dir)):
+            src = os.path.join(out_dir, name)
+            if os.path.isdir(src):
+                shutil.make_archive(os.path.join(zip_dir, name), "zip", src)
+    return total
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Write a synthetic Samsung Health RAW_DATA tree.")
+    ap.add_argument("out_dir")
+    ap.add_argument("--start", default=None,
+                    help="first day (YYYY-MM-DD; default: 30 days before the first cluster)")
+    ap.add_argument("--days", type=int, default=None,
+                    help="days to cover (default: through 30 days after the last cluster)")
+    ap.add_argument("--exports", type=int, default=1)
+    ap.add_argument("--disjoint", action="store_true", help="split days between exports instead of cumulative")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--clusters", default="", help="cluster JSON (default: the pipeline's CLUSTERS)")
+    ap.add_argument("--zip", dest="zip_dir", default=None, help="also write one .zip per export here")
+    args = ap.parse_args(argv)
+
+    clusters = pipeline.load_clusters(args.clusters) if args.clusters else pipeline.CLUSTERS
+    cal_start, cal_end = pipeline.calendar_range(clusters)
+    start = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else (cal_start - timedelta(days=30)).date()
+    days = args.days if args.days is not None else (cal_end.date() - start).days + 31
+
+    n = generate(args.out_dir, start, days, args.exports, args.disjoint, args.seed, clusters,
+                 zip_dir=args.zip_dir)
+    print(f"[OK] {n} binning files, {args.exports} export(s), {start}..{start + timedelta(days=days - 1)} -> {args.out_dir}")
+
+if __name__ == "__main__":
+    main()